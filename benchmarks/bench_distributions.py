@@ -0,0 +1,86 @@
+"""Compare msibi's bonded distribution engine against cmeutils.
+
+Usage:
+    python benchmarks/bench_distributions.py [gsd_file] [--repeats N]
+
+Times the bond, angle and dihedral distributions of the last 20 frames
+of a trajectory computed by msibi.analysis and by cmeutils.structure,
+called as msibi called it before, and reports the largest difference
+between the two histograms.
+"""
+import argparse
+import os
+import timeit
+
+from cmeutils.structure import (
+    angle_distribution,
+    bond_distribution,
+    dihedral_distribution
+)
+import numpy as np
+
+from msibi import Angle, Bond, Dihedral
+from msibi.analysis import analyze_trajectory
+
+ASSET = os.path.join(
+    os.path.dirname(__file__), "..", "msibi", "tests", "assets", "AB-1.0kT.gsd"
+)
+N_FRAMES = 20
+NBINS = 100
+
+
+def benchmark(gsd_file, repeats):
+    bond = Bond(type1="A", type2="B", optimize=True, nbins=NBINS)
+    bond.set_quadratic(x_min=0.0, x_max=3.0, x0=1, k2=200, k3=0, k4=0)
+    angle = Angle(type1="A", type2="B", type3="A", optimize=True, nbins=NBINS)
+    angle.set_quadratic(x0=2, k4=0, k3=0, k2=100, x_min=0, x_max=np.pi)
+    dihedral = Dihedral(
+        type1="A", type2="B", type3="A", type4="B", optimize=True, nbins=NBINS
+    )
+    dihedral.set_quadratic(x0=0, k4=0, k3=0, k2=10, x_min=-np.pi, x_max=np.pi)
+    cmeutils_calls = {
+        bond: lambda: bond_distribution(
+            gsd_file=gsd_file, A_name="A", B_name="B",
+            start=-N_FRAMES, histogram=True, normalize=True,
+            l_min=bond.x_min, l_max=bond.x_max, bins=NBINS + 1
+        ),
+        angle: lambda: angle_distribution(
+            gsd_file=gsd_file, A_name="A", B_name="B", C_name="A",
+            start=-N_FRAMES, histogram=True, normalize=True,
+            theta_min=angle.x_min, theta_max=angle.x_max, bins=NBINS + 1
+        ),
+        dihedral: lambda: dihedral_distribution(
+            gsd_file=gsd_file, A_name="A", B_name="B", C_name="A",
+            D_name="B", start=-N_FRAMES, histogram=True, normalize=True,
+            bins=NBINS + 1
+        ),
+    }
+
+    def msibi_call(force):
+        return lambda: analyze_trajectory(
+            gsd_file, [force], start=-N_FRAMES
+        )[force._key]
+
+    print(f"{'force':<10}{'cmeutils (ms)':>16}{'msibi (ms)':>14}{'max diff':>12}")
+    for force, cmeutils_call in cmeutils_calls.items():
+        t_cme = min(timeit.repeat(cmeutils_call, number=1, repeat=repeats))
+        t_msibi = min(timeit.repeat(msibi_call(force), number=1, repeat=repeats))
+        diff = np.max(np.abs(cmeutils_call()[:, 1] - msibi_call(force)()[:, 1]))
+        name = force.__class__.__name__
+        print(f"{name:<10}{t_cme * 1e3:>16.2f}{t_msibi * 1e3:>14.2f}{diff:>12.2e}")
+
+    forces = list(cmeutils_calls)
+    t_all = min(timeit.repeat(
+        lambda: analyze_trajectory(gsd_file, forces, start=-N_FRAMES),
+        number=1,
+        repeat=repeats
+    ))
+    print(f"All three forces in one msibi pass: {t_all * 1e3:.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("gsd_file", nargs="?", default=ASSET)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+    benchmark(args.gsd_file, args.repeats)
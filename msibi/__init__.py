@@ -4,6 +4,7 @@ from .optimize import MSIBI
 #from .potentials import *
 #from .potentials import quadratic_spring, mie, lennard_jones, pair_tail_correction 
 from .__version__ import __version__
+from . import updaters
 from . import utils
 
 __all__ = [
@@ -14,5 +15,6 @@ __all__ = [
     "Bond",
     "Angle",
     "Dihedral",
+    "updaters",
     "utils"
 ]
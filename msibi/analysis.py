@@ -0,0 +1,580 @@
+import gsd.hoomd
+import numpy as np
+
+import msibi
+
+
+def minimum_image(vectors, box):
+    """Apply the minimum image convention to an array of vectors.
+
+    Parameters
+    ----------
+    vectors : np.ndarray, shape=(n_vectors, 3) or (n_frames, n_vectors, 3)
+        Displacement vectors between particles.
+    box : array-like, shape=(6,) or (n_frames, 6)
+        Hoomd box given as [Lx, Ly, Lz, xy, xz, yz], one per frame
+        if vectors holds several frames.
+
+    """
+    box = np.asarray(box, dtype=float)
+    Lx, Ly, Lz, xy, xz, yz = np.moveaxis(box, -1, 0)
+    h = np.zeros(box.shape[:-1] + (3, 3))
+    h[..., 0, 0] = Lx
+    h[..., 0, 1] = xy * Ly
+    h[..., 0, 2] = xz * Lz
+    h[..., 1, 1] = Ly
+    h[..., 1, 2] = yz * Lz
+    h[..., 2, 2] = np.where(Lz == 0, 1, Lz) # 2D boxes have no extent in z
+    fractional = vectors @ np.swapaxes(np.linalg.inv(h), -1, -2)
+    fractional -= np.round(fractional)
+    return fractional @ np.swapaxes(h, -1, -2)
+
+
+def _group_vectors(positions, box, groups, first, second):
+    """Minimum image vectors from member first to member second of groups."""
+    return minimum_image(
+        positions[..., groups[:, second], :] - positions[..., groups[:, first], :],
+        box
+    )
+
+
+def bond_lengths(positions, box, groups):
+    """Bond lengths of every (i, j) group in groups.
+
+    Positions may be given for a single frame, shape=(N, 3),
+    or a batch of frames, shape=(n_frames, N, 3).
+    """
+    vec = _group_vectors(positions, box, groups, 0, 1)
+    return np.linalg.norm(vec, axis=-1)
+
+
+def bond_angles(positions, box, groups):
+    """Bond angles (radians) of every (i, j, k) group in groups.
+
+    Positions may be given for a single frame, shape=(N, 3),
+    or a batch of frames, shape=(n_frames, N, 3).
+    """
+    vec1 = _group_vectors(positions, box, groups, 1, 0)
+    vec2 = _group_vectors(positions, box, groups, 1, 2)
+    cos_theta = np.sum(vec1 * vec2, axis=-1) / (
+        np.linalg.norm(vec1, axis=-1) * np.linalg.norm(vec2, axis=-1)
+    )
+    return np.arccos(np.clip(cos_theta, -1.0, 1.0))
+
+
+def dihedral_angles(positions, box, groups):
+    """Dihedral angles (radians) of every (i, j, k, l) group in groups.
+
+    Positions may be given for a single frame, shape=(N, 3),
+    or a batch of frames, shape=(n_frames, N, 3).
+    Angles are in the range -pi to pi following the IUPAC sign convention.
+    """
+    b1 = _group_vectors(positions, box, groups, 0, 1)
+    b2 = _group_vectors(positions, box, groups, 1, 2)
+    b3 = _group_vectors(positions, box, groups, 2, 3)
+    n1 = np.cross(b1, b2)
+    n2 = np.cross(b2, b3)
+    x = np.sum(n1 * n2, axis=-1)
+    y = np.linalg.norm(b2, axis=-1) * np.sum(b1 * n2, axis=-1)
+    return np.arctan2(y, x)
+
+
+def _bin_indices(values, bins, x_range):
+    """The bin of each value, or -1 for values outside of x_range."""
+    x_min, x_max = x_range
+    inside = (values >= x_min) & (values <= x_max)
+    inside_values = values[inside]
+    idx = ((inside_values - x_min) * (bins / (x_max - x_min))).astype(np.intp)
+    idx[idx == bins] -= 1
+    # Same round-off corrections as np.histogram
+    edges = np.linspace(x_min, x_max, bins + 1)
+    idx[inside_values < edges[idx]] -= 1
+    idx[(inside_values >= edges[idx + 1]) & (idx != bins - 1)] += 1
+    all_idx = np.full(values.shape, -1, dtype=np.intp)
+    all_idx[inside] = idx
+    return all_idx
+
+
+def histogram(values, bins, x_range):
+    """Count values into evenly spaced bins using np.bincount.
+
+    Matches np.histogram(values, bins, range=x_range)[0]: values outside
+    of x_range are dropped and the last bin includes its right edge.
+
+    """
+    idx = _bin_indices(np.ravel(values), bins, x_range)
+    return np.bincount(idx[idx >= 0], minlength=bins)
+
+
+def frame_histograms(values, bins, x_range):
+    """Histogram each row of a (n_frames, n_values) array separately.
+
+    Returns
+    -------
+    np.ndarray, shape=(n_frames, bins)
+        The counts of each frame, see histogram().
+
+    """
+    idx = _bin_indices(values, bins, x_range)
+    n_frames = len(values)
+    offset_idx = idx + bins * np.arange(n_frames)[:, None]
+    counts = np.bincount(offset_idx[idx >= 0], minlength=n_frames * bins)
+    return counts.reshape(n_frames, bins)
+
+
+def molecule_ids(frame):
+    """Label each particle with the connected cluster of bonds it belongs to."""
+    from scipy.sparse import coo_matrix
+    from scipy.sparse.csgraph import connected_components
+
+    N = frame.particles.N
+    groups = np.asarray(frame.bonds.group, dtype=np.int32).reshape(-1, 2)
+    graph = coo_matrix(
+        (np.ones(len(groups)), (groups[:, 0], groups[:, 1])), shape=(N, N)
+    )
+    n_molecules, labels = connected_components(graph, directed=False)
+    return labels
+
+
+def _group_names(force):
+    """All names of a bonded force's type that can appear in a trajectory."""
+    if isinstance(force, msibi.forces.Bond):
+        types = [force.type1, force.type2]
+    elif isinstance(force, msibi.forces.Angle):
+        types = [force.type1, force.type2, force.type3]
+    else:
+        types = [force.type1, force.type2, force.type3, force.type4]
+    return ["-".join(types), "-".join(types[::-1])]
+
+
+class Topology(object):
+    """Index of a trajectory's particle types, molecules and groups.
+
+    The topology of a state never changes, so it is built once from a
+    single frame and reused by every distribution calculation.
+
+    Parameters
+    ----------
+    types : list of str, required
+        Particle type names.
+    typeid : np.ndarray, required
+        Type index of each particle.
+    molecule_ids : np.ndarray, required
+        Molecule index of each particle, used to exclude bonded pairs.
+    groups : dict, required
+        Maps "bonds", "angles" and "dihedrals" to a dictionary of
+        type name to an array of particle indices of each group.
+
+    """
+
+    _kinds = ("bonds", "angles", "dihedrals")
+
+    def __init__(self, types, typeid, molecule_ids, groups):
+        self.types = list(types)
+        self.typeid = np.asarray(typeid, dtype=np.int32)
+        self.molecule_ids = np.asarray(molecule_ids, dtype=np.int32)
+        self.groups = groups
+
+    @classmethod
+    def from_frame(cls, frame):
+        """Build the topology of a gsd.hoomd.Frame or hoomd.Snapshot."""
+        groups = dict()
+        for kind in cls._kinds:
+            section = getattr(frame, kind)
+            group = np.asarray(section.group, dtype=np.int32)
+            group = group.reshape(-1, {"bonds": 2, "angles": 3}.get(kind, 4))
+            typeid = np.asarray(section.typeid)
+            groups[kind] = {
+                name: group[typeid == idx]
+                for idx, name in enumerate(section.types)
+            }
+        return cls(
+            types=frame.particles.types,
+            typeid=frame.particles.typeid,
+            molecule_ids=molecule_ids(frame),
+            groups=groups
+        )
+
+    @classmethod
+    def load(cls, file_path: str):
+        """Load a topology written by Topology.save()."""
+        with np.load(file_path) as data:
+            groups = {kind: dict() for kind in cls._kinds}
+            for key in data.files:
+                if ":" in key:
+                    kind, name = key.split(":", 1)
+                    groups[kind][name] = data[key]
+            return cls(
+                types=data["types"].tolist(),
+                typeid=data["typeid"],
+                molecule_ids=data["molecule_ids"],
+                groups=groups
+            )
+
+    def save(self, file_path: str) -> None:
+        """Save the topology to a `npz` file."""
+        arrays = {
+            f"{kind}:{name}": group
+            for kind, kind_groups in self.groups.items()
+            for name, group in kind_groups.items()
+        }
+        np.savez(
+            file_path,
+            types=np.array(self.types),
+            typeid=self.typeid,
+            molecule_ids=self.molecule_ids,
+            **arrays
+        )
+
+    def matching_groups(self, kind: str, names: list) -> np.ndarray:
+        """Particle indices of every group of kind whose type is in names."""
+        found = [
+            self.groups[kind][name] for name in dict.fromkeys(names)
+            if name in self.groups[kind]
+        ]
+        if not found:
+            raise ValueError(
+                f"None of the types {names} were found in the trajectory."
+            )
+        return np.concatenate(found)
+
+    def type_mask(self, type_name: str) -> np.ndarray:
+        """Boolean mask selecting the particles of a type."""
+        return self.typeid == self.types.index(type_name)
+
+    def excluded_pairs(self, exclusions: list) -> np.ndarray:
+        """The particle pairs a hoomd neighbor list excludes.
+
+        Parameters
+        ----------
+        exclusions : list of str, required
+            The neighbor list exclusions. Only "bond", "angle",
+            "dihedral", "1-3" and "1-4" are supported.
+
+        Returns
+        -------
+        np.ndarray, shape=(n_pairs, 2)
+            Each excluded pair (i, j) once, with i < j.
+
+        """
+        from scipy.sparse import coo_matrix, diags
+
+        N = len(self.typeid)
+        members = {"bonds": 2, "angles": 3, "dihedrals": 4}
+        groups = {
+            kind: np.concatenate(
+                [np.empty((0, size), dtype=np.int32)]
+                + list(self.groups[kind].values())
+            )
+            for kind, size in members.items()
+        }
+        bonds = groups["bonds"]
+        adjacency = coo_matrix(
+            (np.ones(len(bonds)), (bonds[:, 0], bonds[:, 1])), shape=(N, N)
+        ).tocsr()
+        adjacency = adjacency + adjacency.T
+        pairs = [np.empty((0, 2), dtype=np.int32)]
+        for exclusion in exclusions:
+            if exclusion == "bond":
+                pairs.append(bonds)
+            elif exclusion == "angle":
+                pairs.append(groups["angles"][:, [0, 2]])
+            elif exclusion == "dihedral":
+                pairs.append(groups["dihedrals"][:, [0, 3]])
+            elif exclusion == "1-3":
+                paths = adjacency @ adjacency
+                pairs.append(np.column_stack((paths > 0).nonzero()))
+            elif exclusion == "1-4":
+                # Walks i-j-k-m over 3 bonds that turn back (k == i or
+                # m == j) are not 1-4 paths
+                degree = diags(np.asarray(adjacency.sum(axis=1)).ravel())
+                paths = (
+                    adjacency @ adjacency @ adjacency
+                    - degree @ adjacency
+                    - adjacency @ degree
+                    + adjacency
+                )
+                pairs.append(np.column_stack((paths > 0).nonzero()))
+            else:
+                raise ValueError(f'Unsupported exclusion: "{exclusion}"')
+        pairs = np.sort(np.concatenate(pairs), axis=1)
+        pairs = pairs[pairs[:, 0] != pairs[:, 1]]
+        return np.unique(pairs, axis=0)
+
+
+class DistributionAccumulator(object):
+    """Accumulates the distributions of several forces one frame at a time.
+
+    Parameters
+    ----------
+    forces : list of msibi.forces.Force, required
+        The forces whose distributions are accumulated.
+    exclude_bonded : bool, default True
+        If True, particles from the same molecule are not
+        included in pair distributions.
+    topology : msibi.analysis.Topology, optional
+        The topology shared by every frame, see State.topology.
+        If None, it is built from the first frame added.
+    keep_frames : bool, default False
+        If True, the histogram counts of each frame are kept as well,
+        see DistributionAccumulator.frame_counts()
+
+    Notes
+    -----
+    Frames can be gsd.hoomd.Frame or hoomd.Snapshot objects.
+    Bond, angle and dihedral distributions are normalized histograms,
+    and pair distributions are RDFs, matching Force._get_distribution.
+
+    """
+
+    _sections = dict(bond="bonds", angle="angles", dihedral="dihedrals")
+    _geometry = dict(
+        bond=bond_lengths, angle=bond_angles, dihedral=dihedral_angles
+    )
+
+    def __init__(
+            self,
+            forces: list,
+            exclude_bonded: bool=True,
+            topology: Topology=None,
+            keep_frames: bool=False
+    ):
+        self.exclude_bonded = exclude_bonded
+        self.topology = topology
+        self.keep_frames = keep_frames
+        self.n_frames = 0
+        self._specs = [self._force_spec(force) for force in forces]
+
+    def _force_spec(self, force) -> dict:
+        """Everything about a force needed to accumulate its distribution."""
+        spec = dict(key=force._key, bins=force.nbins + 1, frame_counts=[])
+        if isinstance(force, msibi.forces.Pair):
+            spec["kind"] = "pair"
+            spec["types"] = (force.type1, force.type2)
+            spec["r_range"] = (force.x_min, force.r_cut)
+            # The freud RDF is created on the first frame so that an
+            # unused accumulator can be sent to worker processes.
+            spec["rdf"] = None
+            spec["normalization"] = 1
+            spec["last_counts"] = 0
+            return spec
+        if isinstance(force, msibi.forces.Bond):
+            spec["kind"] = "bond"
+            spec["range"] = (force.x_min, force.x_max)
+        elif isinstance(force, msibi.forces.Angle):
+            spec["kind"] = "angle"
+            spec["range"] = (force.x_min, force.x_max)
+        else:
+            spec["kind"] = "dihedral"
+            spec["range"] = (-np.pi, np.pi)
+        spec["names"] = _group_names(force)
+        spec["groups"] = None
+        spec["counts"] = np.zeros(spec["bins"])
+        return spec
+
+    def add_frame(self, frame) -> None:
+        """Add the values found in a single frame to every distribution."""
+        self.add_frames([frame])
+
+    def add_frames(self, frames: list) -> None:
+        """Add the values found in a batch of frames to every distribution.
+
+        Bond, angle and dihedral values of all frames in the batch are
+        computed together as single array operations.
+
+        """
+        if self.topology is None:
+            self.topology = Topology.from_frame(frames[0])
+        positions = np.stack([frame.particles.position for frame in frames])
+        boxes = np.stack([frame.configuration.box for frame in frames])
+        for spec in self._specs:
+            if spec["kind"] == "pair":
+                for frame_pos, box in zip(positions, boxes):
+                    self._add_pairs(spec, frame_pos, box)
+                continue
+            if spec["groups"] is None:
+                spec["groups"] = self.topology.matching_groups(
+                    self._sections[spec["kind"]], spec["names"]
+                )
+            geometry = self._geometry[spec["kind"]]
+            values = geometry(positions, boxes, spec["groups"])
+            if self.keep_frames:
+                counts = frame_histograms(values, spec["bins"], spec["range"])
+                spec["frame_counts"].append(counts)
+                spec["counts"] += counts.sum(axis=0)
+            else:
+                spec["counts"] += histogram(values, spec["bins"], spec["range"])
+        self.n_frames += len(frames)
+
+    def add_trajectory(
+            self,
+            gsd_file: str,
+            start: int=0,
+            stop: int=None,
+            batch_size: int=20
+    ) -> None:
+        """Add the frames of a trajectory, reading each frame once.
+
+        See msibi.analysis.analyze_trajectory for the parameters.
+        """
+        with gsd.hoomd.open(gsd_file, "r") as traj:
+            frames = range(len(traj))[start:stop]
+            for idx in range(0, len(frames), batch_size):
+                batch = frames[idx:idx + batch_size]
+                self.add_frames([traj[i] for i in batch])
+
+    def _add_pairs(self, spec, positions, box) -> None:
+        """Add a frame to a pair RDF, filtering pairs in the same molecule."""
+        import freud
+
+        type_A = self.topology.type_mask(spec["types"][0])
+        type_B = self.topology.type_mask(spec["types"][1])
+        A_pos = positions[type_A]
+        B_pos = positions[type_B]
+        r_min, r_max = spec["r_range"]
+        if spec["rdf"] is None:
+            spec["rdf"] = freud.density.RDF(
+                bins=spec["bins"], r_max=r_max, r_min=r_min
+            )
+        aq = freud.locality.AABBQuery(freud.box.Box.from_box(box), A_pos)
+        nlist = aq.query(
+            B_pos,
+            dict(
+                r_max=r_max,
+                exclude_ii=spec["types"][0] == spec["types"][1]
+            )
+        ).toNeighborList()
+        if self.exclude_bonded:
+            molecules = self.topology.molecule_ids
+            pre_filter = len(nlist)
+            nlist.filter(
+                molecules[type_A][nlist.point_indices]
+                != molecules[type_B][nlist.query_point_indices]
+            )
+            spec["normalization"] = len(nlist) / pre_filter
+        spec["rdf"].compute(
+            aq, query_points=B_pos, neighbors=nlist, reset=False
+        )
+        if self.keep_frames:
+            # The RDF's counts are accumulated over all frames so far
+            counts = np.copy(spec["rdf"].bin_counts)
+            spec["frame_counts"].append((counts - spec["last_counts"])[None])
+            spec["last_counts"] = counts
+
+    def frame_counts(self) -> dict:
+        """The histogram counts of each frame, if keep_frames is True.
+
+        Returns
+        -------
+        dict
+            Maps Force._key to an array of shape (n_frames, nbins + 1).
+            Pair counts are the number of neighbors found in each bin,
+            so pairs of identical types are counted twice.
+
+        """
+        return {
+            spec["key"]: np.concatenate(spec["frame_counts"])
+            for spec in self._specs if spec["frame_counts"]
+        }
+
+    def distributions(self) -> dict:
+        """The accumulated distribution of each force.
+
+        Returns
+        -------
+        dict
+            Maps Force._key to an array of shape (nbins + 1, 2)
+            holding the bin centers and distribution values.
+
+        """
+        distributions = dict()
+        for spec in self._specs:
+            if spec["kind"] == "pair":
+                rdf = spec["rdf"]
+                y = rdf.rdf * spec["normalization"]
+                dist = np.vstack([rdf.bin_centers, y]).T
+            else:
+                edges = np.linspace(*spec["range"], spec["bins"] + 1)
+                centers = edges[:-1] + np.diff(edges) / 2
+                counts = spec["counts"]
+                total = counts.sum()
+                heights = counts / total if total > 0 else counts
+                dist = np.vstack([centers, heights]).T
+            distributions[spec["key"]] = dist
+        return distributions
+
+
+def analyze_trajectory(
+        gsd_file: str,
+        forces: list,
+        exclude_bonded: bool=True,
+        start: int=0,
+        stop: int=None,
+        batch_size: int=20,
+        topology: Topology=None
+) -> dict:
+    """Compute the distributions of several forces in a single
+    pass over a trajectory.
+
+    Parameters
+    ----------
+    gsd_file : str, required
+        Path to the GSD trajectory.
+    forces : list of msibi.forces.Force, required
+        The forces whose distributions are computed.
+    exclude_bonded : bool, default True
+        If True, particles from the same molecule are not
+        included in pair distributions.
+    start : int, default 0
+        The first frame used.
+    stop : int, default None
+        The frame to stop at (not included).
+    batch_size : int, default 20
+        The number of frames whose bonded values are computed together.
+    topology : msibi.analysis.Topology, optional
+        The topology of the trajectory. If None, it is built from
+        the first frame used.
+
+    Returns
+    -------
+    dict
+        Maps Force._key to the distribution of each force.
+        See DistributionAccumulator.distributions()
+
+    """
+    accumulator = DistributionAccumulator(forces, exclude_bonded, topology)
+    accumulator.add_trajectory(gsd_file, start, stop, batch_size)
+    return accumulator.distributions()
+
+
+def _in_situ_analysis_class():
+    """Create InSituAnalysis, which needs hoomd to be imported."""
+    import hoomd
+
+    class InSituAnalysis(hoomd.custom.Action):
+        """Hoomd action that accumulates distributions during a simulation.
+
+        Parameters
+        ----------
+        accumulator : msibi.analysis.DistributionAccumulator, required
+            Receives a snapshot of the simulation each time the action runs.
+
+        """
+
+        def __init__(self, accumulator: DistributionAccumulator):
+            super().__init__()
+            self.accumulator = accumulator
+
+        def act(self, timestep):
+            self.accumulator.add_frame(self._state.get_snapshot())
+
+    return InSituAnalysis
+
+
+def __getattr__(name):
+    # InSituAnalysis is only defined once it is used, so that importing
+    # this module does not import hoomd.
+    if name == "InSituAnalysis":
+        globals()[name] = _in_situ_analysis_class()
+        return globals()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
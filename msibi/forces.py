@@ -3,17 +3,10 @@ import os
 from typing import Union
 import warnings
 
-from cmeutils.structure import (
-    angle_distribution,
-    bond_distribution,
-    dihedral_distribution,
-    gsd_rdf
-)
-import matplotlib.pyplot as plt
 import numpy as np
-import pandas as pd
 
 import msibi
+from msibi.analysis import analyze_trajectory
 from msibi.potentials import (
     bond_correction,
     lennard_jones,
@@ -21,8 +14,11 @@ from msibi.potentials import (
     pair_correction
 )
 from msibi.utils.error_calculation import calc_similarity
+from msibi.utils.history import History
 from msibi.utils.smoothing import savitzky_golay
 from msibi.utils.sorting import natural_sort
+from msibi.utils.store import DistributionStore
+from msibi.updaters import Updater, get_updater
 
 
 class Force(object):
@@ -33,8 +29,9 @@ class Force(object):
     and msibi.forces.Dihedral.
 
     Forces in MSIBI can either be held constant (i.e. fixed) or
-    optimized (i.e. mutable). Only one type of of force
-    can be optimized at a time (i.e. angles, or pairs, etc..)
+    optimized (i.e. mutable). Several types of force (i.e. angles,
+    and pairs, etc..) can be optimized together,
+    see msibi.optimize.MSIBI.update_schedule.
 
     Parameters
     ----------
@@ -51,6 +48,9 @@ class Force(object):
         and step size (dx).
         It is also used in determining the bin size of the target and query
         distributions.
+    update_method : str or msibi.updaters.Updater, optional, default "ibi"
+        The rule used to update the potential, one of "ibi", "imc" or
+        "anderson", or an Updater instance. See msibi.updaters.
 
     """
 
@@ -59,7 +59,8 @@ class Force(object):
             name: str,
             optimize: bool,
             nbins: int = None,
-            correction_form: str = "linear"
+            correction_form: str = "linear",
+            update_method: Union[str, Updater] = "ibi"
     ):
         if optimize and nbins is None or nbins and nbins<=0:
             raise ValueError(
@@ -69,20 +70,25 @@ class Force(object):
         self.name = name
         self.optimize = optimize
         self.correction_form = correction_form
+        self.update_method = update_method
         self.format = None
         self.xmin = None
         self.xmax = None
         self.dx = None
         self.x_range = None
-        self.potential_history = []
+        self._history_dir = None
+        self._history_in_memory = None
+        self.potential_history = self._new_history("potential")
         self._potential = None
         self._smoothing_window = 3
         self._smoothing_order = 1
         self._nbins = nbins
         self._states = dict()
-        self._head_correction_history = []
-        self._tail_correction_history = []
-        self._learned_potential_history = []
+        self._current_distributions = None
+        self._target_distributions = None
+        self._head_correction_history = self._new_history("head")
+        self._tail_correction_history = self._new_history("tail")
+        self._learned_potential_history = self._new_history("learned")
 
     def __repr__(self):
         return (
@@ -91,6 +97,11 @@ class Force(object):
                 + f"Optimize: {self.optimize}"
         )
 
+    @property
+    def _key(self) -> tuple:
+        """Identifies this force's distributions, names alone are not unique."""
+        return (self.__class__.__name__, self.name)
+
     @property
     def potential(self) -> np.ndarray:
         """The potential energy values V(x)."""
@@ -118,6 +129,15 @@ class Force(object):
             return None
         return -1.0 * np.gradient(self.potential, self.dx)
 
+    @property
+    def update_method(self) -> Updater:
+        """The rule used to update the potential, see msibi.updaters."""
+        return self._update_method
+
+    @update_method.setter
+    def update_method(self, value: Union[str, Updater]):
+        self._update_method = get_updater(value)
+
     @property
     def smoothing_window(self) -> int:
         """Window size used in smoothing the distributions."""
@@ -128,8 +148,7 @@ class Force(object):
         if not isinstance(value, int) or value <= 0:
             raise ValueError("The smoothing window must be an integer.")
         self._smoothing_window = value
-        for state in self._states:
-            self._add_state(state)
+        self._reset_target_distributions(raw=False)
 
     @property
     def smoothing_order(self) -> int:
@@ -141,8 +160,7 @@ class Force(object):
         if not isinstance(value, int) or value <= 0:
             raise ValueError("The smoothing order must be an integer.")
         self._smoothing_order = value
-        for state in self._states:
-            self._add_state(state)
+        self._reset_target_distributions(raw=False)
 
     @property
     def nbins(self) -> int:
@@ -154,8 +172,7 @@ class Force(object):
         if not isinstance(value, int) or value <= 0:
             raise ValueError("nbins must be an integer.")
         self._nbins = value
-        for state in self._states:
-            self._add_state(state)
+        self._reset_target_distributions(raw=True)
 
     def smooth_potential(self) -> None:
         """Smooth and overwrite the current potential.
@@ -198,6 +215,8 @@ class Force(object):
         calling this method.
 
         """
+        import pandas as pd
+
         if self.format != "table":
             raise RuntimeError(
                 "This force is not a table potential and "
@@ -239,7 +258,7 @@ class Force(object):
 
         state_dict = self._states[state]
         state_data = {
-            "target_distribution": state_dict["target_distribution"],
+            "target_distribution": self.target_distribution(state),
             "current_distribution": state_dict["current_distribution"],
             "distribution_history": np.asarray(state_dict["distribution_history"]),
             "f_fit": np.asarray(state_dict["f_fit"])
@@ -255,7 +274,16 @@ class Force(object):
         state : msibi.state.State, required
             The state to use in finding the target distribution.
 
+        Notes
+        -----
+        The target distribution is computed from the state's target
+        trajectory the first time it is needed. The unsmoothed distribution
+        is kept, so changing the smoothing parameters afterwards only
+        repeats the smoothing.
+
         """
+        if self.optimize and self._states[state]["target_distribution"] is None:
+            self._compute_target_distribution(state)
         return self._states[state]["target_distribution"]
 
     def plot_target_distribution(self, state: msibi.state.State, file_path=None) -> None:
@@ -277,6 +305,8 @@ class Force(object):
         and smoothing order.
 
         """
+        import matplotlib.pyplot as plt
+
         # TODO: Make custom error
         if not self.optimize:
             raise RuntimeError(
@@ -284,18 +314,15 @@ class Force(object):
                 "The target distribution is not calculated."
             )
         target = self.target_distribution(state)
+        raw_target = self._states[state]["raw_target_distribution"]
         fig = plt.figure()
         plt.title(f"State {state.name}: {self.name} Target")
         plt.ylabel("P(x)")
         plt.xlabel("x")
-        plt.plot(target[:, 0], target[:, 1])
-        if self.smoothing_window:
-            y_smoothed = savitzky_golay(
-                target[:, 1],
-                window_size=self.smoothing_window,
-                order=self.smoothing_order
-            )
-            plt.plot(target[:, 0], y_smoothed, label="Smoothed")
+        if raw_target is not None:
+            plt.plot(raw_target[:, 0], raw_target[:, 1])
+        if self.smoothing_window and self.smoothing_order:
+            plt.plot(target[:, 0], target[:, 1], label="Smoothed")
             plt.legend()
         if file_path:
             plt.savefig(file_path)
@@ -311,6 +338,8 @@ class Force(object):
             If given, the plot will be saved to this location.
 
        """
+        import matplotlib.pyplot as plt
+
         if not self.optimize:
             raise RuntimeError("This force object is not set to be optimized.")
         fig = plt.figure()
@@ -330,6 +359,8 @@ class Force(object):
             If given, the plot will be saved to this location.
 
         """
+        import matplotlib.pyplot as plt
+
         plt.plot(self.x_range, self.potential, "o-")
         plt.xlim(xlim)
         plt.ylim(ylim)
@@ -348,6 +379,8 @@ class Force(object):
             If given, the plot will be saved to this location.
 
         """
+        import matplotlib.pyplot as plt
+
         for i, pot in enumerate(self.potential_history):
             plt.plot(self.x_range, pot, "o-", label=i)
 
@@ -361,6 +394,8 @@ class Force(object):
             plt.savefig(file_path, bbox_inches='tight')
 
     def plot_distribution_comparison(self, state: msibi.state.State, file_path=None):
+        import matplotlib.pyplot as plt
+
         final_dist = self.distribution_history(state=state)[-1]
         target_dist = self.target_distribution(state=state)
 
@@ -393,8 +428,18 @@ class Force(object):
         state: msibi.state.State
             The state used in finding the distribution.
 
+        Notes
+        -----
+        The array is used as given: it is not smoothed, and it is not
+        replaced by the distribution of the state's target trajectory
+        unless nbins is changed.
+
         """
-        self._states[state]["target_distribution"] = array
+        state_dict = self._states[state]
+        state_dict["target_distribution"] = array
+        state_dict["raw_target_distribution"] = array
+        state_dict["user_target"] = True
+        self._target_distributions = None
 
     def current_distribution(
             self,
@@ -486,6 +531,8 @@ class Force(object):
         Also see: msibi.forces.Force.save_potential()
 
         """
+        import pandas as pd
+
         self.format = "table"
         df = pd.read_csv(file_path)
         self.x_range = df["x"].values
@@ -504,41 +551,122 @@ class Force(object):
         state : msibi.state.State
             Instance of a State object previously created.
 
-        """
-        if self.optimize:
-            target_distribution = self._get_state_distribution(
-                state=state, query=False
-            )
-            if self.smoothing_window and self.smoothing_order:
-                target_distribution[:, 1] = savitzky_golay(
-                    y=target_distribution[:, 1],
-                    window_size=self.smoothing_window,
-                    order=self.smoothing_order,
-                    deriv=0,
-                    rate=1
-                )
+        Notes
+        -----
+        The target distribution is not computed here,
+        see msibi.forces.Force.target_distribution()
 
-        else:
-            target_distribution = None
+        """
         self._states[state] = {
-            "target_distribution": target_distribution,
+            "target_distribution": None,
+            "raw_target_distribution": None,
+            "user_target": False,
             "current_distribution": None,
             "alpha": state.alpha,
             "f_fit": [],
-            "distribution_history": [],
+            "reweighted_f_fit": [],
+            "distribution_history": self._new_history(
+                f"distribution-{os.path.basename(state.dir)}"
+            ),
             "path": state.dir
         }
+        self._current_distributions = None
+        self._target_distributions = None
+
+    def _new_history(self, name: str, entries: list=()) -> History:
+        """Create a history, stored in the history directory if one is set.
+
+        Parameters
+        ----------
+        name : str
+            Name of the history, used in its file name.
+        entries : list, optional
+            Entries to copy into the new history.
+
+        """
+        if self._history_dir is None:
+            history = History()
+        else:
+            file_name = f"{self.__class__.__name__}-{self.name}-{name}.bin"
+            history = History(
+                file_path=os.path.join(self._history_dir, file_name),
+                max_in_memory=self._history_in_memory
+            )
+        for entry in entries:
+            history.append(entry)
+        return history
 
-    def _compute_current_distribution(self, state: msibi.state.State) -> None:
-        """Find the current distribution of the query trajectory
+    def _set_history_storage(
+            self,
+            directory: str,
+            max_in_memory: int=None
+    ) -> None:
+        """Move the potential and distribution histories to files.
+
+        See msibi.optimize.MSIBI history_dir and history_in_memory.
+        """
+        self._history_dir = directory
+        self._history_in_memory = max_in_memory
+        self.potential_history = self._new_history(
+            "potential", self.potential_history
+        )
+        self._head_correction_history = self._new_history(
+            "head", self._head_correction_history
+        )
+        self._tail_correction_history = self._new_history(
+            "tail", self._tail_correction_history
+        )
+        self._learned_potential_history = self._new_history(
+            "learned", self._learned_potential_history
+        )
+        for state, state_dict in self._states.items():
+            state_dict["distribution_history"] = self._new_history(
+                f"distribution-{os.path.basename(state.dir)}",
+                state_dict["distribution_history"]
+            )
+
+    def _truncate_histories(self) -> None:
+        """Drop history data written after the last recorded entry,
+        see msibi.optimize.MSIBI.resume().
+        """
+        histories = [
+            self.potential_history,
+            self._head_correction_history,
+            self._tail_correction_history,
+            self._learned_potential_history,
+        ] + [
+            state_dict["distribution_history"]
+            for state_dict in self._states.values()
+        ]
+        for history in histories:
+            history.truncate()
+
+    def _compute_target_distribution(
+            self,
+            state: msibi.state.State,
+            distribution: np.ndarray=None
+    ) -> None:
+        """Smooth and store the target distribution of a state.
 
         Parameters
         ----------
         state : msibi.state.State
-            Instance of a State object previously created.
+            Instance of a State object previously added.
+        distribution : np.ndarray, optional
+            The unsmoothed target distribution. If None, the unsmoothed
+            distribution already stored is used, otherwise it is computed
+            from the state's target trajectory or loaded from the
+            state's cache.
 
         """
-        distribution = self._get_state_distribution(state, query=True)
+        state_dict = self._states[state]
+        if distribution is not None:
+            state_dict["raw_target_distribution"] = distribution
+        elif state_dict["raw_target_distribution"] is None:
+            state_dict["raw_target_distribution"] = (
+                state._target_distributions([self])[self._key]
+            )
+        distribution = np.copy(state_dict["raw_target_distribution"])
         if self.smoothing_window and self.smoothing_order:
             distribution[:, 1] = savitzky_golay(
                 y=distribution[:, 1],
@@ -547,15 +675,102 @@ class Force(object):
                 deriv=0,
                 rate=1
             )
-            negative_idx = np.where(distribution[:, 1] < 0)[0]
-            distribution[:, 1][negative_idx] = 0
-        self._states[state]["current_distribution"] = distribution
+        state_dict["target_distribution"] = distribution
+        self._target_distributions = None
+
+    def _reset_target_distributions(self, raw: bool) -> None:
+        """Drop the stored target distributions so they are recomputed
+        the next time they are needed.
+
+        Parameters
+        ----------
+        raw : bool
+            If True, the unsmoothed distributions are dropped as well,
+            otherwise only the smoothing is repeated.
+
+        """
+        self._target_distributions = None
+        for state_dict in self._states.values():
+            if raw:
+                state_dict["raw_target_distribution"] = None
+                state_dict["user_target"] = False
+            elif state_dict["user_target"]:
+                continue
+            state_dict["target_distribution"] = None
+
+    def _compute_current_distributions(
+            self,
+            distributions: dict=None,
+            reweighted: bool=False
+    ) -> None:
+        """Find the current distributions of the query trajectories
+        of every state, and their fit scores.
+
+        Parameters
+        ----------
+        distributions : dict, optional
+            Maps states to unsmoothed distributions to use instead of the
+            query trajectories', e.g. ones estimated by reweighting.
+        reweighted : bool, optional, default False
+            If True, the distributions are estimates made by reweighting,
+            and their fit scores are kept apart from the measured ones,
+            in each state's "reweighted_f_fit".
 
-        f_fit = calc_similarity(
-            distribution[:, 1],
-            self._states[state]["target_distribution"][:, 1]
+        """
+        if distributions is None:
+            distributions = {
+                state: self._get_state_distribution(state, query=True)
+                for state in self._states
+            }
+        stacked = np.array([distributions[state] for state in self._states])
+        if self.smoothing_window and self.smoothing_order:
+            stacked[..., 1] = savitzky_golay(
+                y=stacked[..., 1],
+                window_size=self.smoothing_window,
+                order=self.smoothing_order,
+                deriv=0,
+                rate=1
+            )
+            np.clip(stacked[..., 1], 0, None, out=stacked[..., 1])
+        self._set_current_distributions(stacked)
+        f_fits = calc_similarity(
+            stacked[..., 1], self._stacked_target_distributions()
         )
-        self._states[state]["f_fit"].append(f_fit)
+        fit_key = "reweighted_f_fit" if reweighted else "f_fit"
+        for state, f_fit in zip(self._states, f_fits):
+            self._states[state][fit_key].append(f_fit)
+
+    def _set_current_distributions(self, stacked) -> None:
+        """Store the current distributions of every state.
+
+        Parameters
+        ----------
+        stacked : array-like, shape=(n_states, n_bins, 2)
+            The distributions, in the order the states were added.
+            Each state's current_distribution is a view into this array.
+
+        """
+        self._current_distributions = np.array(stacked, dtype=float)
+        for state_dict, distribution in zip(
+                self._states.values(), self._current_distributions
+        ):
+            state_dict["current_distribution"] = distribution
+
+    def _stacked_target_distributions(self) -> np.ndarray:
+        """The target distributions P(x) of every state,
+        shape=(n_states, n_bins), in the order the states were added.
+        """
+        if self._target_distributions is None:
+            self._target_distributions = np.array(
+                [self.target_distribution(state)[:, 1] for state in self._states]
+            )
+        return self._target_distributions
+
+    def _state_parameters(self) -> tuple:
+        """The kT and alpha of every state, as arrays of shape=(n_states,)."""
+        kT = np.array([state.kT for state in self._states], dtype=float)
+        alpha = np.array([state.alpha for state in self._states], dtype=float)
+        return kT, alpha
 
     def _get_state_distribution(
             self,
@@ -572,50 +787,87 @@ class Force(object):
             If True, uses the most recent query trajectory.
             If False, uses the state's target trajectory.
 
+        Notes
+        -----
+        If the distribution was accumulated during the most recent query
+        simulation (see msibi.optimize.MSIBI in_situ_analysis),
+        that result is used instead of reading the query trajectory.
+
         """
+        if query and self._key in state._query_distributions:
+            return np.copy(state._query_distributions[self._key])
         if query:
             traj = state.query_traj
+            n_frames = state.query_n_frames
         else:
             traj = state.traj_file
-        return self._get_distribution(state=state, gsd_file=traj)
+            n_frames = state.n_frames
+        return self._get_distribution(
+            state=state, gsd_file=traj, n_frames=n_frames
+        )
+
+    def _frame_counts(self, state: msibi.state.State) -> np.ndarray:
+        """The histogram counts of each frame of the last query simulation.
+
+        Pairs of identical types are found from both particles,
+        so their counts are halved to count each pair once.
+
+        """
+        frame_counts = state._query_frame_counts[self._key]
+        if isinstance(self, Pair) and self.type1 == self.type2:
+            return frame_counts / 2
+        return frame_counts
 
     def _save_current_distribution(
             self,
             state: msibi.state.State,
-            iteration: int
+            iteration: int,
+            text: bool=False
     ) -> None:
-        """Save the corresponding distrubiton for a given state to a file.
+        """Save the corresponding distrubiton for a given state.
+
+        The distribution is appended to the state's binary distribution
+        store, see msibi.state.State.read_distributions().
 
         Parameters
         ----------
         state : State
             The state used in finding the distribution.
         iteration : int
-            Current iteration step, used in the filename.
+            Current iteration step.
+        text : bool, optional, default False
+            If True, the distribution is also saved to a text file
+            with the iteration in its filename.
 
         """
         distribution = self._states[state]["current_distribution"]
         distribution[:, 0] -= self.dx / 2
-        fname = f"dist_{self.name}-state_{state.name}-step_{iteration}.txt"
-        fpath = os.path.join(state.dir, fname)
-        np.savetxt(fpath, distribution)
+        DistributionStore(state.distribution_file).append(
+            self._key, iteration, distribution
+        )
+        if text:
+            fname = f"dist_{self.name}-state_{state.name}-step_{iteration}.txt"
+            fpath = os.path.join(state.dir, fname)
+            np.savetxt(fpath, distribution)
 
-    def _update_potential(self) -> None:
+    def _update_potential(self, reweighted: bool=False) -> None:
         """Compare distributions of current iteration against target,
         and update the potential via Boltzmann inversion.
 
+        Parameters
+        ----------
+        reweighted : bool, optional, default False
+            If True, the current distributions are estimates made by
+            reweighting and are not added to the distribution histories.
+
         """
         self.potential_history.append(np.copy(self.potential))
-        for state in self._states:
-            kT = state.kT
-            current_dist = self._states[state]["current_distribution"]
-            target_dist = self._states[state]["target_distribution"]
-            self._states[state]["distribution_history"].append(current_dist)
-            N = len(self._states)
-            # TODO: Use potential setter here? Does it work with +=?
-            self._potential += state.alpha * (
-                    kT * np.log(current_dist[:, 1] / target_dist[:, 1]) / N
-            )
+        if not reweighted:
+            for state_dict in self._states.values():
+                state_dict["distribution_history"].append(
+                    state_dict["current_distribution"]
+                )
+        self._potential = self._potential + self.update_method.step(self)
         # TODO: Add correction funcs to Force classes
         # TODO: Smoothing potential before doing head and tail corrections?
         self._potential, real, head_cut, tail_cut = self._correction_function(
@@ -649,6 +901,8 @@ class Bond(Force):
         and step size (dx).
         It is also used in determining the bin size of the target and query
         distributions.
+    update_method : str or msibi.updaters.Updater, optional, default "ibi"
+        The rule used to update the potential, see msibi.updaters.
 
     Notes
     -----
@@ -666,7 +920,8 @@ class Bond(Force):
             type2: str,
             optimize: bool,
             nbins: int = None,
-            correction_form: str = "linear"
+            correction_form: str = "linear",
+            update_method: Union[str, Updater] = "ibi"
     ):
         self.type1, self.type2 = sorted(
             [type1, type2], key=natural_sort
@@ -677,7 +932,8 @@ class Bond(Force):
             name=name,
             optimize=optimize,
             nbins=nbins,
-            correction_form=correction_form
+            correction_form=correction_form,
+            update_method=update_method
         )
 
     def set_harmonic(self, r0: Union[float, int], k: Union[float, int]) -> None:
@@ -716,7 +972,8 @@ class Bond(Force):
     def _get_distribution(
             self,
             state: msibi.state.State,
-            gsd_file: str
+            gsd_file: str,
+            n_frames: int
     ) -> np.ndarray:
         """Calculate a bond length distribution.
 
@@ -726,19 +983,16 @@ class Bond(Force):
             State used in calculating the distribution.
         gsd_file: str, required
             Path to the GSD file used.
+        n_frames: int, required
+            The number of frames at the end of the GSD file used.
 
         """
-        return bond_distribution(
+        return analyze_trajectory(
             gsd_file=gsd_file,
-            A_name=self.type1,
-            B_name=self.type2,
-            start=-state.n_frames,
-            histogram=True,
-            normalize=True,
-            l_min=self.x_min,
-            l_max=self.x_max,
-            bins=self.nbins + 1
-        )
+            forces=[self],
+            start=-n_frames,
+            topology=state.topology
+        )[self._key]
 
 
 class Angle(Force):
@@ -766,6 +1020,8 @@ class Angle(Force):
         and step size (dx).
         It is also used in determining the bin size of the target and query
         distributions.
+    update_method : str or msibi.updaters.Updater, optional, default "ibi"
+        The rule used to update the potential, see msibi.updaters.
 
     Notes
     -----
@@ -781,7 +1037,8 @@ class Angle(Force):
             type3: str,
             optimize: bool,
             nbins: int = None,
-            correction_form: str = "linear"
+            correction_form: str = "linear",
+            update_method: Union[str, Updater] = "ibi"
     ):
         self.type1 = type1
         self.type2 = type2
@@ -792,7 +1049,8 @@ class Angle(Force):
             name=name,
             optimize=optimize,
             nbins=nbins,
-            correction_form=correction_form
+            correction_form=correction_form,
+            update_method=update_method
         )
 
     def set_harmonic(self, t0: Union[float, int], k: Union[float, int]) -> None:
@@ -826,7 +1084,8 @@ class Angle(Force):
     def _get_distribution(
             self,
             state: msibi.state.State,
-            gsd_file: str
+            gsd_file: str,
+            n_frames: int
     ) -> np.ndarray:
         """Calculate a bond angle distribution.
 
@@ -836,20 +1095,16 @@ class Angle(Force):
             State used in calculating the distribution.
         gsd_file: str, required
             Path to the GSD file used.
+        n_frames: int, required
+            The number of frames at the end of the GSD file used.
 
         """
-        return angle_distribution(
+        return analyze_trajectory(
             gsd_file=gsd_file,
-            A_name=self.type1,
-            B_name=self.type2,
-            C_name=self.type3,
-            start=-state.n_frames,
-            histogram=True,
-            normalize=True,
-            theta_min=self.x_min,
-            theta_max=self.x_max,
-            bins=self.nbins + 1
-        )
+            forces=[self],
+            start=-n_frames,
+            topology=state.topology
+        )[self._key]
 
 
 class Pair(Force):
@@ -899,7 +1154,8 @@ class Pair(Force):
             r_cut: Union[float, int],
             nbins: int = None,
             exclude_bonded: bool = False,
-            correction_form: str = "linear"
+            correction_form: str = "linear",
+            update_method: Union[str, Updater] = "ibi"
     ):
         self._correction_function = pair_correction
         self.type1, self.type2 = sorted([type1, type2], key=natural_sort)
@@ -911,7 +1167,8 @@ class Pair(Force):
             name=name,
             optimize=optimize,
             nbins=nbins,
-            correction_form=correction_form
+            correction_form=correction_form,
+            update_method=update_method
         )
 
     def set_lj(
@@ -957,7 +1214,8 @@ class Pair(Force):
     def _get_distribution(
             self,
             state: msibi.state.State,
-            gsd_file: str
+            gsd_file: str,
+            n_frames: int
     ) -> np.ndarray:
         """Calculate a pair distribution.
 
@@ -967,23 +1225,17 @@ class Pair(Force):
             State used in calculating the distribution.
         gsd_file: str, required
             Path to the GSD file used.
+        n_frames: int, required
+            The number of frames at the end of the GSD file used.
 
         """
-        rdf, N = gsd_rdf(
-            gsdfile=gsd_file,
-            A_name=self.type1,
-            B_name=self.type2,
-            r_min=self.x_min,
-            r_max=self.r_cut,
+        return analyze_trajectory(
+            gsd_file=gsd_file,
+            forces=[self],
             exclude_bonded=state.exclude_bonded,
-            start=-state.n_frames,
-            stop=-1,
-            bins=self.nbins + 1
-        )
-        x = rdf.bin_centers
-        y = rdf.rdf * N
-        dist = np.vstack([x, y])
-        return dist.T
+            start=-n_frames,
+            topology=state.topology
+        )[self._key]
 
 
 class Dihedral(Force):
@@ -1014,6 +1266,8 @@ class Dihedral(Force):
         and step size (dx).
         It is also used in determining the bin size of the target and query
         distributions.
+    update_method : str or msibi.updaters.Updater, optional, default "ibi"
+        The rule used to update the potential, see msibi.updaters.
 
     Notes
     -----
@@ -1030,7 +1284,8 @@ class Dihedral(Force):
             type4: str,
             optimize: bool,
             nbins: int = None,
-            correction_form: str = "linear"
+            correction_form: str = "linear",
+            update_method: Union[str, Updater] = "ibi"
     ):
         self.type1 = type1
         self.type2 = type2
@@ -1042,7 +1297,8 @@ class Dihedral(Force):
             name=name,
             optimize=optimize,
             nbins=nbins,
-            correction_form=correction_form
+            correction_form=correction_form,
+            update_method=update_method
         )
 
     def set_harmonic(
@@ -1084,7 +1340,8 @@ class Dihedral(Force):
     def _get_distribution(
             self,
             state: msibi.state.State,
-            gsd_file: str
+            gsd_file: str,
+            n_frames: int
     ) -> np.ndarray:
         """Calculate a dihedral distribution.
 
@@ -1094,16 +1351,13 @@ class Dihedral(Force):
             State used in calculating the distribution.
         gsd_file: str, required
             Path to the GSD file used.
+        n_frames: int, required
+            The number of frames at the end of the GSD file used.
 
         """
-        return dihedral_distribution(
-                gsd_file=gsd_file,
-                A_name=self.type1,
-                B_name=self.type2,
-                C_name=self.type3,
-                D_name=self.type4,
-                start=-state.n_frames,
-                histogram=True,
-                normalize=True,
-                bins=self.nbins + 1
-        )
+        return analyze_trajectory(
+            gsd_file=gsd_file,
+            forces=[self],
+            start=-n_frames,
+            topology=state.topology
+        )[self._key]
@@ -1,12 +1,24 @@
+from __future__ import annotations
+
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
 import os
 import pickle
 import shutil
+from typing import Callable, Union
 
-import hoomd
-from hoomd.md.methods import ConstantVolume, ConstantPressure
 import numpy as np
 
 import msibi
+from msibi.analysis import DistributionAccumulator
+from msibi.utils.cache import write_atomic
+from msibi.utils.store import DistributionStore
+from msibi.utils.schedules import AdaptiveSchedule, scheduled_value
+from msibi.utils.reweighting import (
+    boltzmann_weights,
+    effective_sample_size,
+    reweight_distribution,
+)
 
 
 class MSIBI(object):
@@ -36,6 +48,93 @@ class MSIBI(object):
         Sets the pair exclusions used during the optimization simulations
     seed : int, optional, default 42
         Random seed to use during the simulation
+    n_workers : int, optional, default 1
+        Number of worker processes used to run the query simulations.
+        If greater than 1, the query simulations of all states are run
+        in parallel in a process pool during each iteration.
+    threads_per_worker : int, optional, default None
+        Number of CPU threads given to each query simulation.
+        If None, the device is chosen by hoomd.device.auto_select().
+    persistent_simulations : bool, optional, default False
+        If True, each state keeps one hoomd Simulation alive for the
+        whole optimization. Between iterations only the new table
+        potentials are pushed into its existing force objects, which
+        avoids repeating the simulation setup and autotuning.
+        Cannot be combined with n_workers greater than 1.
+    in_situ_analysis : bool, optional, default False
+        If True, the distributions of the forces being optimized are
+        accumulated while the query simulations run, rather than being
+        computed afterwards from the query trajectories.
+    write_query_trajectory : bool, optional, default True
+        If False, query.gsd is not written during the query simulations.
+        This requires in_situ_analysis to be True.
+    warm_start : bool, optional, default False
+        If True, each query simulation continues from the final
+        configuration of the state's previous query simulation, rather
+        than starting again from the last frame of its target trajectory.
+        This reduces the equilibration needed in later iterations.
+    checkpoint_file : str, optional, default None
+        If given, the complete state of the optimization is saved to
+        this pickle file after every iteration, replacing the previous
+        checkpoint atomically. See MSIBI.resume().
+    history_dir : str, optional, default None
+        If given, the potential and distribution histories of every force
+        are also written to binary files in this directory.
+    history_in_memory : int, optional, default None
+        The number of most recent history entries of each force kept
+        in memory. Older entries are read back from the files in
+        history_dir when needed. If None, every entry is kept.
+    save_distribution_text : bool, optional, default False
+        If True, the query distribution of every force, state and
+        iteration is also saved to its own text file in the state
+        directory. They are always saved to each state's binary
+        distribution store, see msibi.state.State.read_distributions().
+    reweight_updates : int, optional, default 0
+        Number of extra potential updates made after each query
+        simulation without running new simulations. The distributions
+        under each updated potential are estimated by Boltzmann
+        reweighting the frames of the last query simulations. Their fit
+        scores are kept in each force's "reweighted_f_fit", apart from
+        the fit scores measured once per iteration. Optimized pairs can
+        only be reweighted when the pairs left out of their RDF, see
+        State.exclude_bonded, are those excluded by nlist_exclusions.
+    min_effective_samples : float, optional, default 0.5
+        The smallest fraction of effective samples (Kish's effective
+        sample size over the number of frames) accepted in any state
+        when reweighting. Below this, the reweighted updates stop and
+        a new query simulation is run.
+    update_schedule : str, optional, default "simultaneous"
+        How the potentials are updated when several types of force
+        (i.e. Bonds, Angles, Pairs, etc) are optimized together.
+        With "simultaneous", every optimized force is updated each
+        iteration. With "alternating", one type of force is updated
+        per iteration, in the order the types were first added.
+        In both cases the forces share one set of query simulations
+        and one analysis of the query trajectories per iteration.
+    f_fit_target : float, optional, default None
+        Stop the optimization once the fit score of every optimized
+        force is at least this in every state.
+    min_improvement : float, optional, default None
+        Stop the optimization once the fit score of every optimized
+        force has improved by less than this relative amount over the
+        last convergence_window iterations in every state.
+    max_potential_change : float, optional, default None
+        Stop the optimization once the largest change made to any
+        optimized potential by its most recent update is less than this.
+    convergence_window : int, optional, default 5
+        The number of iterations used by min_improvement.
+    freeze_converged : bool, optional, default False
+        If True, each optimized force is frozen once it meets any of the
+        convergence criteria above after an update. A frozen force keeps
+        its potential fixed, and its distributions are only computed
+        every freeze_check_period iterations to check it is still
+        converged. The optimization stops once every optimized force
+        is frozen. Requires at least one convergence criterion.
+    freeze_tolerance : float, optional, default 0.01
+        A frozen force is optimized again if its fit score in any state
+        drops by more than this from its score when it was frozen.
+    freeze_check_period : int, optional, default 5
+        The number of iterations between checks of the frozen forces.
 
     Attributes
     ----------
@@ -49,6 +148,11 @@ class MSIBI(object):
         All angles to be used in the optimization procedure.
     dihedrals : list of msibi.bonds.Dihedral
         All dihedrals to be used in the optimization procedure.
+    stop_reason : str
+        Why the last call to run_optimization() stopped before running
+        all of its iterations, or None if it did not stop early.
+    frozen_forces : list of msibi.forces.Force
+        The optimized forces currently frozen, see freeze_converged.
 
     Methods
     -------
@@ -76,7 +180,29 @@ class MSIBI(object):
             gsd_period: int,
             nlist_exclusions: list[str]=["bond", "angle"],
             seed: int=42,
+            n_workers: int=1,
+            threads_per_worker: int=None,
+            persistent_simulations: bool=False,
+            in_situ_analysis: bool=False,
+            write_query_trajectory: bool=True,
+            warm_start: bool=False,
+            checkpoint_file: str=None,
+            history_dir: str=None,
+            history_in_memory: int=None,
+            save_distribution_text: bool=False,
+            reweight_updates: int=0,
+            min_effective_samples: float=0.5,
+            update_schedule: str="simultaneous",
+            f_fit_target: float=None,
+            min_improvement: float=None,
+            max_potential_change: float=None,
+            convergence_window: int=5,
+            freeze_converged: bool=False,
+            freeze_tolerance: float=0.01,
+            freeze_check_period: int=5,
     ):
+        import hoomd
+
         if integrator_method not in [
                 hoomd.md.methods.ConstantVolume,
                 hoomd.md.methods.ConstantPressure
@@ -86,6 +212,47 @@ class MSIBI(object):
                     "(hoomd.md.methods.ConstantVolume), or NPT "
                     "(hoomd.md.methods.ConstantPressure)"
             )
+        if not isinstance(n_workers, int) or n_workers <= 0:
+            raise ValueError("n_workers must be a positive integer.")
+        if persistent_simulations and n_workers > 1:
+            raise ValueError(
+                    "Persistent simulations cannot be run in worker "
+                    "processes. Use n_workers=1."
+            )
+        if not (write_query_trajectory or in_situ_analysis):
+            raise ValueError(
+                    "The query trajectory must be written when "
+                    "in_situ_analysis is False."
+            )
+        if not isinstance(reweight_updates, int) or reweight_updates < 0:
+            raise ValueError("reweight_updates must be a non-negative integer.")
+        if not 0 < min_effective_samples <= 1:
+            raise ValueError("min_effective_samples must be in (0, 1].")
+        if history_in_memory is not None and history_dir is None:
+            raise ValueError("history_in_memory requires a history_dir.")
+        if update_schedule not in ["simultaneous", "alternating"]:
+            raise ValueError(
+                    "update_schedule must be 'simultaneous' or 'alternating'."
+            )
+        if f_fit_target is not None and not 0 < f_fit_target <= 1:
+            raise ValueError("f_fit_target must be in (0, 1].")
+        if min_improvement is not None and min_improvement <= 0:
+            raise ValueError("min_improvement must be positive.")
+        if max_potential_change is not None and max_potential_change <= 0:
+            raise ValueError("max_potential_change must be positive.")
+        if not isinstance(convergence_window, int) or convergence_window <= 0:
+            raise ValueError("convergence_window must be a positive integer.")
+        if freeze_converged and (
+                f_fit_target is None
+                and min_improvement is None
+                and max_potential_change is None
+        ):
+            raise ValueError(
+                    "freeze_converged requires f_fit_target, min_improvement "
+                    "or max_potential_change."
+            )
+        if not isinstance(freeze_check_period, int) or freeze_check_period <= 0:
+            raise ValueError("freeze_check_period must be a positive integer.")
         self.nlist = nlist
         self.integrator_method = integrator_method
         self.thermostat = thermostat
@@ -95,10 +262,87 @@ class MSIBI(object):
         self.gsd_period = gsd_period
         self.seed = seed
         self.nlist_exclusions = nlist_exclusions
+        self.n_workers = n_workers
+        self.threads_per_worker = threads_per_worker
+        self.persistent_simulations = persistent_simulations
+        self.in_situ_analysis = in_situ_analysis
+        self.write_query_trajectory = write_query_trajectory
+        self.warm_start = warm_start
+        self.checkpoint_file = checkpoint_file
+        self.history_dir = history_dir
+        self.history_in_memory = history_in_memory
+        self.save_distribution_text = save_distribution_text
+        self.reweight_updates = reweight_updates
+        self.min_effective_samples = min_effective_samples
+        self.update_schedule = update_schedule
+        self.f_fit_target = f_fit_target
+        self.min_improvement = min_improvement
+        self.max_potential_change = max_potential_change
+        self.convergence_window = convergence_window
+        self.freeze_converged = freeze_converged
+        self.freeze_tolerance = freeze_tolerance
+        self.freeze_check_period = freeze_check_period
+        self.stop_reason = None
         self.n_iterations = 0
+        self._run_plan = None
         self.states = []
         self.forces = []
         self._optimize_forces = []
+        # Maps each frozen force to its fit score in each state when frozen
+        self._frozen_forces = dict()
+
+    def __setstate__(self, state):
+        # States do not pickle the MSIBI managing them.
+        self.__dict__.update(state)
+        for msibi_state in self.states:
+            msibi_state._opt = self
+
+    @classmethod
+    def resume(cls, checkpoint_file: str, n_iterations: int=None) -> "MSIBI":
+        """Load an optimization from a checkpoint and continue it.
+
+        Parameters
+        ----------
+        checkpoint_file : str, required
+            A checkpoint written during MSIBI.run_optimization(),
+            see MSIBI.checkpoint_file.
+        n_iterations : int, optional, default None
+            Number of iterations to run. If None, the iterations left
+            in the interrupted run_optimization() call are run.
+
+        Returns
+        -------
+        msibi.optimize.MSIBI
+            The restored optimization, after running the iterations.
+
+        Notes
+        -----
+        Target distributions and finished iterations are restored
+        rather than recomputed. Persistent simulations are created again.
+        Distributions and histories written after the checkpoint, by an
+        iteration interrupted before it was checkpointed, are dropped.
+
+        """
+        with open(checkpoint_file, "rb") as f:
+            msibi = pickle.load(f)
+        # Drop output of an iteration that finished after the checkpoint
+        for state in msibi.states:
+            DistributionStore(state.distribution_file).truncate(
+                    msibi.n_iterations
+            )
+        for force in msibi.forces:
+            force._truncate_histories()
+        plan = msibi._run_plan
+        if n_iterations is None:
+            n_iterations = plan["last_iteration"] - msibi.n_iterations
+        if n_iterations > 0:
+            msibi.run_optimization(
+                    n_steps=plan["n_steps"],
+                    n_iterations=n_iterations,
+                    backup_trajectories=plan["backup_trajectories"],
+                    n_frames=plan["n_frames"]
+            )
+        return msibi
 
     def add_state(self, state: msibi.state.State) -> None:
         """Add a state point to MSIBI.states.
@@ -122,13 +366,18 @@ class MSIBI(object):
 
         Notes
         -----
-        Only one type of force can be optimized at a time.
+        Forces of different types can be optimized together,
+        see MSIBI.update_schedule.
         Forces not set to be optimized are held fixed during query simulations.
 
         """
         self.forces.append(force)
+        if self.history_dir is not None:
+            force._set_history_storage(
+                    self.history_dir, self.history_in_memory
+            )
         if force.optimize:
-            self._add_optimize_force(force)
+            self._optimize_forces.append(force)
         for state in self.states:
             force._add_state(state)
 
@@ -152,21 +401,60 @@ class MSIBI(object):
         """All instances of msibi.forces.Dihedral that have been added."""
         return [f for f in self.forces if isinstance(f, msibi.forces.Dihedral)]
 
-    def _add_optimize_force(self, force):
-        if not all(
-                [isinstance(force, f.__class__) for f in self._optimize_forces]
-        ):
-            raise RuntimeError(
-                    "Only one type of force (i.e. Bonds, Angles, Pairs, etc) "
-                    "can be set to optimize at a time."
-            )
-        self._optimize_forces.append(force)
+    @property
+    def frozen_forces(self):
+        """The optimized forces currently frozen, see freeze_converged."""
+        return list(self._frozen_forces)
+
+    @property
+    def _keep_frame_counts(self) -> bool:
+        """Whether the query distributions are needed for each frame."""
+        return self.reweight_updates > 0 or any(
+                force.update_method.needs_frame_counts
+                for force in self._optimize_forces
+        )
+
+    def _active_forces(self) -> list:
+        """The optimized forces updated in the current iteration,
+        see MSIBI.update_schedule.
+        """
+        forces = [
+                force for force in self._optimize_forces
+                if force not in self._frozen_forces
+        ]
+        if self.update_schedule == "simultaneous" or not forces:
+            return forces
+        groups = dict()
+        for force in forces:
+            groups.setdefault(force.__class__, []).append(force)
+        groups = list(groups.values())
+        return groups[self.n_iterations % len(groups)]
+
+    def _checking_frozen_forces(self) -> bool:
+        """Whether the frozen forces are checked in the current iteration."""
+        return (
+                bool(self._frozen_forces)
+                and self.n_iterations % self.freeze_check_period == 0
+        )
+
+    def _analyzed_forces(self) -> list:
+        """The optimized forces whose query distributions are computed
+        in the current iteration. Frozen forces are skipped, except when
+        they are checked, see MSIBI.freeze_check_period.
+        """
+        if self._checking_frozen_forces():
+            return list(self._optimize_forces)
+        return [
+                force for force in self._optimize_forces
+                if force not in self._frozen_forces
+        ]
 
     def run_optimization(
             self,
-            n_steps: int,
+            n_steps: Union[int, list, Callable],
             n_iterations: int,
             backup_trajectories: bool=False,
+            n_frames: Union[int, list, Callable]=None,
             _dir=None
     ) -> None:
         """Runs query simulations and performs MSIBI
@@ -174,34 +462,107 @@ class MSIBI(object):
 
         Parameters
         ----------
-        n_steps : int, required
+        n_steps : int, list of int or callable, required
             Number of simulation steps during each iteration.
+            A list gives the number for each iteration, and a callable
+            is called with the iteration and returns the number.
+            Use msibi.utils.schedules.AdaptiveSchedule to increase the
+            number as the changes to the potentials shrink.
         n_iterations : int, required
             Number of MSIBI update iterations.
         backup_trajectories : bool, optional default False
             If True, copies of the query simulation trajectories
             are saved in their respective msibi.state.State directory.
+            Requires MSIBI.write_query_trajectory to be True.
+        n_frames : int, list of int or callable, optional, default None
+            Number of query trajectory frames used to compute the query
+            distributions during each iteration, given like n_steps.
+            If None, each state's n_frames is used.
+
+        Notes
+        -----
+        When MSIBI.n_workers is greater than 1, the query simulations
+        are run in spawned worker processes. Scripts using this must
+        protect their entry point with `if __name__ == "__main__":`.
+
+        The optimization stops early once any of the convergence criteria
+        set (f_fit_target, min_improvement or max_potential_change) is met
+        by every optimized force, see MSIBI.stop_reason.
+
+        Iterations in lists and callables are counted from the start of
+        the optimization, see MSIBI.n_iterations. With a checkpoint_file,
+        callables must be picklable, e.g. functions defined at the top
+        level of a module.
 
         """
-        for n in range(n_iterations):
-            print(f"---Optimization: {n+1} of {n_iterations}---")
-            forces = self._build_force_objects()
-            for state in self.states:
-                state._run_simulation(
-                    n_steps=n_steps,
-                    forces=forces,
-                    integrator_method=self.integrator_method,
-                    method_kwargs=self.method_kwargs,
-                    thermostat=self.thermostat,
-                    thermostat_kwargs=self.thermostat_kwargs,
-                    dt=self.dt,
-                    seed=self.seed,
-                    iteration=self.n_iterations,
-                    gsd_period=self.gsd_period,
-                    backup_trajectories=backup_trajectories
+        if backup_trajectories and not self.write_query_trajectory:
+            raise ValueError(
+                    "Query trajectories cannot be backed up when "
+                    "write_query_trajectory is False."
+            )
+        if self.reweight_updates:
+            self._check_pair_reweighting()
+        self._compute_target_distributions()
+        self.stop_reason = None
+        self._run_plan = dict(
+                n_steps=n_steps,
+                last_iteration=self.n_iterations + n_iterations,
+                backup_trajectories=backup_trajectories,
+                n_frames=n_frames
+        )
+        executor = None
+        if self.n_workers > 1 and len(self.states) > 1:
+            executor = ProcessPoolExecutor(
+                    max_workers=min(self.n_workers, len(self.states)),
+                    mp_context=multiprocessing.get_context("spawn")
+            )
+        try:
+            for n in range(n_iterations):
+                if self._optimize_forces and not self._analyzed_forces():
+                    # Every force is frozen and none is checked this time
+                    self.stop_reason = self._stop_reason()
+                    print(f"Optimization stopped: {self.stop_reason}")
+                    self._run_plan["last_iteration"] = self.n_iterations
+                    break
+                print(f"---Optimization: {n+1} of {n_iterations}---")
+                forces = self._build_force_objects()
+                sim_potentials = [
+                        np.copy(force.potential)
+                        for force in self._optimize_forces
+                ]
+                # Without a schedule, each state uses its own n_frames
+                for state in self.states:
+                    state.query_n_frames = (
+                            None if n_frames is None
+                            else scheduled_value(n_frames, self.n_iterations)
+                    )
+                self._run_simulations(
+                        n_steps=scheduled_value(n_steps, self.n_iterations),
+                        forces=forces,
+                        backup_trajectories=backup_trajectories,
+                        executor=executor
                 )
-            self._update_potentials()
-            self.n_iterations += 1
+                self._update_potentials()
+                if self.reweight_updates:
+                    self._reweighted_updates(sim_potentials)
+                for schedule in (n_steps, n_frames):
+                    if isinstance(schedule, AdaptiveSchedule):
+                        schedule.update(
+                                self._potential_change(sim_potentials)
+                        )
+                self.n_iterations += 1
+                self.stop_reason = self._stop_reason()
+                if self.stop_reason:
+                    print(f"Optimization stopped: {self.stop_reason}")
+                    # Nothing is left to run when resuming from here
+                    self._run_plan["last_iteration"] = self.n_iterations
+                if self.checkpoint_file:
+                    self._save_checkpoint()
+                if self.stop_reason:
+                    break
+        finally:
+            if executor is not None:
+                executor.shutdown()
 
     def pickle_forces(self, file_path: str) -> None:
         """Save the Hoomd objects for all forces to a single pickle file.
@@ -226,8 +587,151 @@ class MSIBI(object):
         f = open(file_path, "wb")
         pickle.dump(forces, f)
 
+    def _potential_change(self, sim_potentials: list) -> float:
+        """The largest change made to any optimized potential since
+        the query simulations used the potentials in sim_potentials.
+        """
+        change = 0.0
+        for force, sim_potential in zip(self._optimize_forces, sim_potentials):
+            diff = np.abs(force.potential - sim_potential)
+            diff = diff[np.isfinite(diff)]
+            if diff.size:
+                change = max(change, diff.max())
+        return change
+
+    def _criteria_met(self, force: msibi.forces.Force) -> list:
+        """The convergence criteria met by an optimized force in every state.
+
+        Only fit scores measured from query simulations are used,
+        not the estimates made by reweighting.
+
+        Returns
+        -------
+        list of str
+            The names of the criteria met, out of "f_fit_target",
+            "min_improvement" and "max_potential_change".
+        """
+        met = []
+        f_fits = [force._states[state]["f_fit"] for state in self.states]
+        if self.f_fit_target is not None and all(
+                f_fit and f_fit[-1] >= self.f_fit_target for f_fit in f_fits
+        ):
+            met.append("f_fit_target")
+        window = self.convergence_window
+        if self.min_improvement is not None and all(
+                len(f_fit) > window
+                and f_fit[-1] - f_fit[-1 - window]
+                < self.min_improvement * abs(f_fit[-1 - window])
+                for f_fit in f_fits
+        ):
+            met.append("min_improvement")
+        history = force.potential_history
+        if self.max_potential_change is not None and len(history) >= 2:
+            change = np.abs(history[-1] - history[-2])
+            change = change[np.isfinite(change)]
+            if change.size and change.max() < self.max_potential_change:
+                met.append("max_potential_change")
+        return met
+
+    def _stop_reason(self) -> str:
+        """The convergence criterion met by every optimized force,
+        or None if the optimization should continue. The optimization
+        also stops once every optimized force is frozen.
+        """
+        if not self._optimize_forces:
+            return None
+        if len(self._frozen_forces) == len(self._optimize_forces):
+            return (
+                    "freeze_converged: every optimized force is frozen "
+                    f"after {self.n_iterations} iterations."
+            )
+        met = set.intersection(
+                *[set(self._criteria_met(f)) for f in self._optimize_forces]
+        )
+        descriptions = {
+                "f_fit_target":
+                    f"every fit score reached {self.f_fit_target}",
+                "min_improvement":
+                    f"every fit score improved by less than "
+                    f"{self.min_improvement} over the last "
+                    f"{self.convergence_window} iterations",
+                "max_potential_change":
+                    f"every potential changed by less than "
+                    f"{self.max_potential_change}"
+        }
+        for criterion, description in descriptions.items():
+            if criterion in met:
+                return (
+                        f"{criterion}: {description} "
+                        f"after {self.n_iterations} iterations."
+                )
+        return None
+
+    def _save_checkpoint(self) -> None:
+        """Atomically replace the checkpoint with the current state."""
+        write_atomic(self.checkpoint_file, lambda f: pickle.dump(self, f))
+
+    def _run_simulations(
+            self,
+            n_steps: int,
+            forces: list,
+            backup_trajectories: bool,
+            executor: ProcessPoolExecutor=None
+    ) -> None:
+        """Run the query simulation of each state.
+
+        If an executor is given, every state is submitted to it at once
+        and this method returns only after all simulations have finished.
+        """
+        sim_kwargs = dict(
+                n_steps=n_steps,
+                integrator_method=self.integrator_method,
+                method_kwargs=self.method_kwargs,
+                thermostat=self.thermostat,
+                thermostat_kwargs=self.thermostat_kwargs,
+                dt=self.dt,
+                seed=self.seed,
+                iteration=self.n_iterations,
+                gsd_period=self.gsd_period,
+                backup_trajectories=backup_trajectories,
+                num_cpu_threads=self.threads_per_worker,
+                persistent=self.persistent_simulations,
+                write_trajectory=self.write_query_trajectory,
+                warm_start=self.warm_start
+        )
+        state_kwargs = {state: dict(sim_kwargs) for state in self.states}
+        if self.in_situ_analysis:
+            for state in self.states:
+                state_kwargs[state]["accumulator"] = DistributionAccumulator(
+                        forces=self._analyzed_forces(),
+                        exclude_bonded=state.exclude_bonded,
+                        topology=state.topology,
+                        keep_frames=self._keep_frame_counts
+                )
+        if executor is None:
+            for state in self.states:
+                if self.persistent_simulations:
+                    state_forces = self._persistent_force_objects(state)
+                else:
+                    state_forces = forces
+                state._run_simulation(
+                        forces=state_forces, **state_kwargs[state]
+                )
+            return
+        futures = [
+                executor.submit(
+                    _run_state_simulation, state, forces, state_kwargs[state]
+                )
+                for state in self.states
+        ]
+        for state, future in zip(self.states, futures):
+            # Copy back anything the worker process changed on its State
+            state.__dict__.update(future.result().__dict__)
+
     def _build_force_objects(self) -> list:
         """Creates force objects for query simulations."""
+        import hoomd
+
         # Create pair objects
         pair_force = None
         for pair in self.pairs:
@@ -287,25 +791,227 @@ class MSIBI(object):
         forces = [pair_force, bond_force, angle_force, dihedral_force]
         return [f for f in forces if f] # Filter out any None values
 
+    def _persistent_force_objects(self, state: msibi.state.State) -> list:
+        """Get the force objects used by a state's persistent simulation.
+
+        Each live simulation needs its own set of force objects. These are
+        created the first time, afterwards the attached objects are
+        updated in place with the current table potentials.
+        """
+        if state._sim is None:
+            return self._build_force_objects()
+        forces = list(state._sim.operations.integrator.forces)
+        self._update_force_objects(forces)
+        return forces
+
+    def _update_force_objects(self, forces: list) -> None:
+        """Push the current table potentials into existing force objects."""
+        import hoomd
+
+        for hoomd_force in forces:
+            if isinstance(hoomd_force, hoomd.md.pair.Table):
+                for pair in self.pairs:
+                    hoomd_force.params[pair._pair_name] = pair._table_entry()
+                continue
+            if isinstance(hoomd_force, hoomd.md.bond.Bond):
+                msibi_forces = self.bonds
+            elif isinstance(hoomd_force, hoomd.md.angle.Angle):
+                msibi_forces = self.angles
+            elif isinstance(hoomd_force, hoomd.md.dihedral.Dihedral):
+                msibi_forces = self.dihedrals
+            else:
+                continue
+            for force in msibi_forces:
+                if force.format == "table":
+                    hoomd_force.params[force.name] = force._table_entry()
+
+    def _compute_target_distributions(self) -> None:
+        """Compute any missing target distributions of the optimized forces,
+        reading each state's target trajectory (or cache) only once.
+        """
+        for state in self.states:
+            forces = [
+                    force for force in self._optimize_forces
+                    if force._states[state]["raw_target_distribution"] is None
+            ]
+            if not forces:
+                continue
+            distributions = state._target_distributions(forces)
+            for force in forces:
+                force._compute_target_distribution(
+                        state, distributions[force._key]
+                )
+
+    def _analyze_query_trajectories(self) -> None:
+        """Compute the query distributions of all optimized forces,
+        reading each state's query trajectory only once.
+        """
+        for state in self.states:
+            if state._accumulated_in_situ:
+                continue
+            accumulator = DistributionAccumulator(
+                    forces=self._analyzed_forces(),
+                    exclude_bonded=state.exclude_bonded,
+                    topology=state.topology,
+                    keep_frames=self._keep_frame_counts
+            )
+            accumulator.add_trajectory(
+                    state.query_traj, start=-state.query_n_frames
+            )
+            state._query_distributions = accumulator.distributions()
+            state._query_frame_counts = accumulator.frame_counts()
+
     def _update_potentials(self) -> None:
-        """Update the potentials for the potentials to be optimized."""
-        for force in self._optimize_forces:
+        """Update the potentials for the potentials to be optimized.
+
+        The distributions of every optimized force are recomputed,
+        but only the active forces are updated, see MSIBI.update_schedule.
+        Frozen forces are skipped, see MSIBI.freeze_converged.
+        """
+        self._analyze_query_trajectories()
+        active_forces = self._active_forces()
+        for force in self._analyzed_forces():
             self._recompute_distribution(force)
-            force._update_potential()
+            if force in active_forces:
+                force._update_potential()
+        if self.freeze_converged:
+            self._update_frozen_forces(active_forces)
+
+    def _update_frozen_forces(self, updated_forces: list) -> None:
+        """Freeze the forces that converged after their update, and
+        optimize again the checked frozen forces whose fit drifted.
+        """
+        if self._checking_frozen_forces():
+            for force, frozen_fits in list(self._frozen_forces.items()):
+                drift = max(
+                        frozen_fit - force._states[state]["f_fit"][-1]
+                        for state, frozen_fit in zip(self.states, frozen_fits)
+                )
+                if drift > self.freeze_tolerance:
+                    del self._frozen_forces[force]
+                    print(f"Force {force.name} is optimized again.")
+        for force in updated_forces:
+            if self._criteria_met(force):
+                self._frozen_forces[force] = [
+                        force._states[state]["f_fit"][-1]
+                        for state in self.states
+                ]
+                print(f"Force {force.name} converged and is frozen.")
+
+    def _check_pair_reweighting(self) -> None:
+        """Check that the RDF of each optimized pair counts the pairs
+        the query simulations apply its potential to, so that the
+        energy changes used to reweight frames are complete.
+        """
+        for state in self.states:
+            topology = state.topology
+            excluded = topology.excluded_pairs(self.nlist_exclusions)
+            molecules = topology.molecule_ids
+            for pair in self.pairs:
+                if not pair.optimize:
+                    continue
+                A = topology.type_mask(pair.type1)
+                B = topology.type_mask(pair.type2)
+                i, j = excluded.T
+                n_excluded = np.count_nonzero(
+                        (A[i] & B[j]) | (A[j] & B[i])
+                )
+                n_uncounted = 0
+                if state.exclude_bonded:
+                    # Every pair in the same molecule is left out of the RDF
+                    n_molecules = molecules.max() + 1
+                    n_A = np.bincount(molecules[A], minlength=n_molecules)
+                    n_B = np.bincount(molecules[B], minlength=n_molecules)
+                    if pair.type1 == pair.type2:
+                        n_uncounted = np.sum(n_A * (n_A - 1) // 2)
+                    else:
+                        n_uncounted = np.sum(n_A * n_B)
+                if n_excluded != n_uncounted:
+                    raise ValueError(
+                            f"Pair {pair.name} cannot be reweighted in state "
+                            f"{state.name}: the pairs left out of its RDF "
+                            f"(exclude_bonded={state.exclude_bonded}) are not "
+                            "the pairs excluded from the query simulations "
+                            f"(nlist_exclusions={self.nlist_exclusions})."
+                    )
+
+    def _reweighted_updates(self, sim_potentials: list) -> None:
+        """Update the potentials again without running new simulations.
+
+        The frames of the last query simulations, which used the
+        potentials in sim_potentials, are reweighted by
+        exp(-dU/kT) to estimate the distributions under the updated
+        potentials. This stops early once the effective sample size
+        of any state becomes too small for the estimate to be reliable.
+        Only the active forces are updated, see MSIBI.update_schedule.
+        """
+        active_forces = self._active_forces()
+        if not active_forces:
+            return
+        for update in range(self.reweight_updates):
+            distributions = dict()
+            for state in self.states:
+                delta_U = 0
+                for force, sim_potential in zip(
+                        self._optimize_forces, sim_potentials
+                ):
+                    if force._key not in state._query_frame_counts:
+                        continue # Frozen during the query simulation
+                    delta_U = delta_U + force._frame_counts(state) @ (
+                            force.potential - sim_potential
+                    )
+                weights = boltzmann_weights(delta_U, state.kT)
+                ess = effective_sample_size(weights) / len(weights)
+                if ess < self.min_effective_samples:
+                    print(
+                        f"Reweighting stopped after {update} updates: "
+                        f"effective sample fraction {ess:.2f} "
+                        f"for state {state.name}."
+                    )
+                    print()
+                    return
+                for force in active_forces:
+                    distributions[(force, state)] = reweight_distribution(
+                            state._query_distributions[force._key],
+                            state._query_frame_counts[force._key],
+                            weights
+                    )
+            for force in active_forces:
+                force._compute_current_distributions(
+                        {state: distributions[(force, state)]
+                         for state in self.states},
+                        reweighted=True
+                )
+                force._update_potential(reweighted=True)
 
     def _recompute_distribution(self, force: msibi.forces.Force) -> None:
         """Recompute the current distribution of bond lengths or angles"""
+        force._compute_current_distributions()
         for state in self.states:
-            force._compute_current_distribution(state)
             force._save_current_distribution(
                     state,
-                    iteration=self.n_iterations
+                    iteration=self.n_iterations,
+                    text=self.save_distribution_text
             )
             print("Force: {0}, State: {1}, Iteration: {2}: {3:f}".format(
                     force.name,
                     state.name,
                     self.n_iterations,
-                    force._states[state]["f_fit"][self.n_iterations]
+                    force._states[state]["f_fit"][-1]
                 )
             )
             print()
+
+
+def _run_state_simulation(
+        state: msibi.state.State,
+        forces: list,
+        sim_kwargs: dict
+) -> msibi.state.State:
+    """Run a single query simulation inside a worker process.
+
+    The forces and state are copies sent to the worker, so the state is
+    returned to let the parent process pick up any changes made to it.
+    """
+    state._run_simulation(forces=forces, **sim_kwargs)
+    return state
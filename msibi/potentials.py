@@ -1,8 +1,6 @@
 import warnings
 
-import more_itertools as mit
 import numpy as np
-from scipy.optimize import curve_fit
 
 from msibi.utils.general import find_nearest
 
@@ -40,24 +38,8 @@ def pair_correction(r, V, form, r_switch=2.5):
     else:
         raise ValueError(f'Unsupported head correction form: "{form}"')
 
-    real_idx = np.where(np.isfinite(V))[0]
-    # Check for continuity of real_indices:
-    if not np.all(np.ediff1d(real_idx) == 1):
-        start = real_idx[0]
-        end = real_idx[-1]
-        # Correct nans, infs that are surrounded by 2 finite numbers
-        for idx, v in enumerate(V[start:end]):
-            if not np.isfinite(v):
-                try:
-                    avg = (V[idx + start - 1] + V[idx + start + 1]) / 2
-                    V[idx + start] = avg
-                except IndexError:
-                    pass
-        # Trim off edge cases
-        _real_idx = np.where(np.isfinite(V))[0]
-        real_idx = max(
-            [list(g) for g in mit.consecutive_groups(_real_idx)], key=len
-        )
+    V[:], first_real, last_real = repair_potentials(V)
+    real_idx = np.arange(first_real, last_real + 1)
 
     head_cutoff = real_idx[0] - 1
     tail_cutoff = real_idx[-1] + 1
@@ -74,8 +56,6 @@ def bond_correction(r, V, form):
     """Handles corrections for both the head and tail of
     bond scretching and angle potentials.
     """
-    import more_itertools as mit
-
     if form == "linear":
         head_correction_function = linear_head_correction
         tail_correction_function = linear_tail_correction
@@ -88,24 +68,8 @@ def bond_correction(r, V, form):
     else:
         raise ValueError(f'Unsupported head correction form: "{form}"')
 
-    real_idx = np.where(np.isfinite(V))[0]
-    # Check for continuity of real_indices:
-    if not np.all(np.ediff1d(real_idx) == 1):
-        start = real_idx[0]
-        end = real_idx[-1]
-        # Correct nans, infs that are surrounded by 2 finite numbers
-        for idx, v in enumerate(V[start:end]):
-            if not np.isfinite(v):
-                try:
-                    avg = (V[idx + start - 1] + V[idx + start + 1]) / 2
-                    V[idx + start] = avg
-                except IndexError:
-                    pass
-        # Trim off edge cases
-        _real_idx = np.where(np.isfinite(V))[0]
-        real_idx = max(
-            [list(g) for g in mit.consecutive_groups(_real_idx)], key=len
-        )
+    V[:], first_real, last_real = repair_potentials(V)
+    real_idx = np.arange(first_real, last_real + 1)
 
     head_cutoff = real_idx[0] - 1
     tail_cutoff = real_idx[-1] + 1
@@ -118,6 +82,86 @@ def bond_correction(r, V, form):
     return tail_correction_V, real_idx, head_cutoff, tail_cutoff
 
 
+def repair_potentials(V):
+    """Fill single non-finite gaps in potentials and find their longest
+    finite run, for one potential or a batch of them.
+
+    A non-finite value with finite neighbors on both sides is replaced
+    by their average. Longer non-finite gaps between finite values stay
+    non-finite, combining the non-finite values found in the gap.
+
+    Parameters
+    ----------
+    V : np.ndarray, shape=(n_points,) or (n_potentials, n_points)
+        The potential values, which may contain nan and inf.
+
+    Returns
+    -------
+    V : np.ndarray
+        A repaired copy of V.
+    first_real, last_real : int or np.ndarray of int
+        The first and last index of the longest run of finite values
+        left in each potential (the first of the longest runs on ties).
+
+    """
+    V = np.array(V, dtype=float)
+    batch = V.ndim == 2
+    V = np.atleast_2d(V)
+    n_points = V.shape[1]
+    finite = np.isfinite(V)
+    if not np.all(np.any(finite, axis=1)):
+        raise ValueError("A potential has no finite values to correct.")
+    idx = np.arange(n_points)
+    first = np.argmax(finite, axis=1)[:, None]
+    last = n_points - 1 - np.argmax(finite[:, ::-1], axis=1)[:, None]
+    gaps = ~finite & (idx > first) & (idx < last)
+    if np.any(gaps):
+        # First and last index of the gap each non-finite value is in
+        gap_start = np.maximum.accumulate(
+            np.where(gaps & ~np.roll(gaps, 1, axis=1), idx, -1), axis=1
+        )
+        gap_end = np.minimum.accumulate(
+            np.where(gaps & ~np.roll(gaps, -1, axis=1), idx, n_points)[:, ::-1],
+            axis=1
+        )[:, ::-1]
+        rows, cols = np.nonzero(gaps)
+        start = gap_start[rows, cols]
+        end = gap_end[rows, cols]
+        # Sums of a finite and a non-finite value are the non-finite value,
+        # so from left to right each value in a longer gap becomes the
+        # combination of the non-finite values up to its right neighbor.
+        counts = [
+            np.cumsum(np.pad(flags, ((0, 0), (1, 0))), axis=1)
+            for flags in (np.isposinf(V), np.isneginf(V), np.isnan(V))
+        ]
+        right = np.minimum(cols + 1, end)
+        n_pos, n_neg, n_nan = [
+            count[rows, right + 1] - count[rows, start + 1] for count in counts
+        ]
+        combined = np.where(
+            (n_nan > 0) | ((n_pos > 0) & (n_neg > 0)),
+            np.nan,
+            np.where(n_pos > 0, np.inf, -np.inf)
+        )
+        V[rows, cols] = combined
+        single = start == end
+        rows, cols = rows[single], cols[single]
+        V[rows, cols] = (V[rows, cols - 1] + V[rows, cols + 1]) / 2
+
+    # Runs of finite values: starts and (exclusive) ends, in row order
+    padded = np.pad(np.isfinite(V), ((0, 0), (1, 1))).astype(np.int8)
+    run_rows, run_starts = np.nonzero(np.diff(padded, axis=1) == 1)
+    run_ends = np.nonzero(np.diff(padded, axis=1) == -1)[1]
+    lengths = run_ends - run_starts
+    order = np.lexsort((run_starts, -lengths, run_rows))
+    longest = order[np.unique(run_rows[order], return_index=True)[1]]
+    first_real = run_starts[longest]
+    last_real = run_ends[longest] - 1
+    if not batch:
+        return V[0], int(first_real[0]), int(last_real[0])
+    return V, first_real, last_real
+
+
 def pair_tail_correction(r, V, r_switch):
     """Apply a tail correction to a potential making it go to zero smoothly.
 
@@ -225,8 +269,8 @@ def linear_tail_correction(r, V, cutoff, window=6):
 def linear_tail_correction_optimized(r, V, cutoff, window=6):
     """Use a linear function to smoothly force V to a finite value at V(cut).
 
-    This function uses scipy.optimize.curve_fit to find the slope and intercept
-    of the linear function that is used to correct the tail of the potential.
+    This function uses a least squares fit (see linear_fit) to find the
+    slope and intercept of the line used to correct the tail of the potential.
 
     Parameters
     ----------
@@ -240,12 +284,10 @@ def linear_tail_correction_optimized(r, V, cutoff, window=6):
         Number of data points backward from cutoff to use in slope calculation
 
     """
-
-    def linear(x, m, b):
-        return m * x + b
-
-    popt, pcov = curve_fit(linear, r[cutoff - window:cutoff], V[cutoff - window:cutoff])
-    V[cutoff:] = linear(r[cutoff:], *popt)
+    slope, intercept = linear_fit(
+        r[cutoff - window:cutoff], V[cutoff - window:cutoff]
+    )
+    V[cutoff:] = slope * r[cutoff:] + intercept
     return V
 
 
@@ -275,8 +317,8 @@ def linear_head_correction(r, V, cutoff, window=6):
 def linear_head_correction_optimized(r, V, cutoff, window=6):
     """Use a linear function to smoothly force V to a finite value at V(0).
 
-    This function uses scipy.optimize.curve_fit to find the slope and intercept
-    of the linear function that is used to correct the head of the potential.
+    This function uses a least squares fit (see linear_fit) to find the
+    slope and intercept of the line used to correct the head of the potential.
 
     Parameters
     ----------
@@ -289,16 +331,14 @@ def linear_head_correction_optimized(r, V, cutoff, window=6):
     window : int
         Number of data points forward from cutoff to use in slope calculation
     """
-
-    def linear(x, m, b):
-        return m * x + b
-
-    popt, pcov = curve_fit(linear, r[cutoff + 1:cutoff + window], V[cutoff + 1:cutoff + window])
-    V[:cutoff + 1] = linear(r[:cutoff + 1], *popt)
+    slope, intercept = linear_fit(
+        r[cutoff + 1:cutoff + window], V[cutoff + 1:cutoff + window]
+    )
+    V[:cutoff + 1] = slope * r[:cutoff + 1] + intercept
     return V
 
 
-def exponential_tail_correction(r, V, cutoff):
+def exponential_tail_correction(r, V, cutoff, window=6):
     """Use an exponential function to smoothly force V to a finite value at V(cut)
 
     Parameters
@@ -309,19 +349,30 @@ def exponential_tail_correction(r, V, cutoff):
         Potential at each of the separation values
     cutoff : int
         The last non-real value of V when iterating backwards
+    window : int
+        Number of data points backward from cutoff used in the fit
 
-    This function fits the small part of the potential to the form:
-    V(r) = A*exp(Br)
+    This function fits the last real part of the potential to the form:
+    V(r) = A*exp(Br), see exponential_fit. If the fitted values change
+    sign, no exponential fits them and a linear fit is used instead,
+    see linear_tail_correction_optimized.
 
     """
-    raise RuntimeError("Exponential tail corrections are not implemented."
-                       "Use the linear correction form when optimizing bonds and angles."
-                       )
-    dr = r[cutoff - 1] - r[cutoff - 2]
-    B = np.log(V[cutoff - 1] / V[cutoff - 2]) / dr
-    A = V[cutoff - 1] * np.exp(B * r[cutoff - 1])
-    V[cutoff:] = A * np.exp(B * r[cutoff:])
-    return V
+    if cutoff >= len(V):
+        return V
+    start = max(cutoff - window, 0)
+    V_fit = V[start:cutoff]
+    if np.all(V_fit > 0) or np.all(V_fit < 0):
+        A, B = exponential_fit(r[start:cutoff], V_fit)
+        V[cutoff:] = A * np.exp(B * r[cutoff:])
+        return V
+    warnings.warn(
+        "The tail of the potential changes sign, so an exponential "
+        "cannot be fit to it. A linear tail correction is used instead."
+    )
+    return linear_tail_correction_optimized(
+        r, V, cutoff, window=cutoff - start
+    )
 
 
 def exponential_head_correction(r, V, cutoff):
@@ -347,6 +398,54 @@ def exponential_head_correction(r, V, cutoff):
     return V
 
 
+def linear_fit(x, y):
+    """Closed form least squares fit of y = slope * x + intercept.
+
+    Parameters
+    ----------
+    x, y : np.ndarray, shape=(..., n_points)
+        The points to fit. Leading dimensions are fit separately,
+        so many fits can be done in one call.
+
+    Returns
+    -------
+    slope, intercept : float or np.ndarray, shape=(...)
+
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    dx = x - x.mean(axis=-1, keepdims=True)
+    dy = y - y.mean(axis=-1, keepdims=True)
+    slope = np.sum(dx * dy, axis=-1) / np.sum(dx * dx, axis=-1)
+    intercept = y.mean(axis=-1) - slope * x.mean(axis=-1)
+    return slope, intercept
+
+
+def exponential_fit(x, y):
+    """Least squares fit of y = A * exp(B * x), done as a linear fit
+    of log|y|.
+
+    Parameters
+    ----------
+    x, y : np.ndarray, shape=(..., n_points)
+        The points to fit. The y values of each fit must be non-zero
+        and share the same sign, which is the sign of A.
+
+    Returns
+    -------
+    A, B : float or np.ndarray, shape=(...)
+
+    """
+    y = np.asarray(y, dtype=float)
+    sign = np.sign(y[..., :1])
+    if np.any(y * sign <= 0):
+        raise ValueError(
+            "An exponential can only be fit to values of the same sign."
+        )
+    B, log_A = linear_fit(x, np.log(y * sign))
+    return np.squeeze(sign, axis=-1) * np.exp(log_A), B
+
+
 def alpha_array(alpha0, pot_r, form="linear"):
     """Generate an array of alpha values used for scaling in the IBI step. """
     if form == "linear":
@@ -1,10 +1,26 @@
+from __future__ import annotations
+
 import os
 import shutil
 from typing import Union
 import warnings
 
 import gsd.hoomd
-import hoomd
+
+from msibi.__version__ import __version__
+from msibi.analysis import (
+    DistributionAccumulator,
+    Topology,
+    analyze_trajectory
+)
+from msibi.utils.cache import (
+    cache_key,
+    file_hash,
+    load_array,
+    save_array,
+    write_atomic
+)
+from msibi.utils.store import read_distributions
 
 
 class State(object):
@@ -23,6 +39,20 @@ class State(object):
         during optimization.
     alpha : (Union[float, int]), default 1.0
         The alpha value used to scale the weight of this state.
+    save_topology : bool, default False
+        If True, the topology index of this state is saved to cache_dir,
+        keyed by the contents of traj_file, and loaded from there by
+        later jobs using the same trajectory. Requires cache_dir.
+    save_start_frame : bool, default False
+        If True, the frame query simulations start from (the last frame
+        of traj_file) is saved as a small gsd file in cache_dir, keyed by
+        the contents of traj_file, and loaded from there by later jobs
+        using the same trajectory. Requires cache_dir.
+    cache_dir : str, optional
+        Directory used to cache target distributions between jobs.
+        Cached distributions are keyed by the contents of traj_file,
+        the force type and range, nbins, n_frames and exclude_bonded,
+        so the same directory can be shared by many states and jobs.
 
     Attributes
     ----------
@@ -38,6 +68,9 @@ class State(object):
         Path to where the State info with be saved.
     query_traj : str
         Path to the query trajectory that is created during each iteration.
+    distribution_file : str
+        Path to the binary store of the query distributions of every
+        iteration, see State.read_distributions().
 
     """
 
@@ -49,18 +82,49 @@ class State(object):
         n_frames: int,
         alpha: float=1.0,
         exclude_bonded: bool=True, #TODO: Do we use this here or in Force?
+        save_topology: bool=False,
+        save_start_frame: bool=False,
+        cache_dir: str=None,
         _dir=None
     ):
+        if save_topology and cache_dir is None:
+            raise ValueError("save_topology requires a cache_dir.")
+        if save_start_frame and cache_dir is None:
+            raise ValueError("save_start_frame requires a cache_dir.")
         self.name = name
         self.kT = kT
         self.traj_file = os.path.abspath(traj_file)
         self._n_frames = n_frames
+        self._query_n_frames = None
         self._opt = None
+        self._sim = None
+        self._query_distributions = dict()
+        self._query_frame_counts = dict()
+        # Whether the query distributions were accumulated in situ
+        self._accumulated_in_situ = False
+        self._topology = None
+        self._start_frame = None
+        self.save_topology = save_topology
+        self.save_start_frame = save_start_frame
+        self.cache_dir = cache_dir
+        self._traj_hash = None
         self._alpha = float(alpha)
         self.dir = self._setup_dir(name, kT, dir_name=_dir)
         self.query_traj = os.path.join(self.dir, "query.gsd")
+        self.restart_file = os.path.join(self.dir, "restart.gsd")
+        self.distribution_file = os.path.join(
+                self.dir, "query_distributions.bin"
+        )
         self.exclude_bonded = exclude_bonded
 
+    def __getstate__(self):
+        # Worker processes only need the State, not the MSIBI managing it.
+        # Live hoomd simulations cannot be pickled.
+        state = self.__dict__.copy()
+        state.pop("_opt", None)
+        state["_sim"] = None
+        return state
+
     def __repr__(self):
         return (
                 f"{self.__class__}; "
@@ -78,6 +142,64 @@ class State(object):
     def n_frames(self, value: int):
         self._n_frames = value
 
+    @property
+    def query_n_frames(self) -> int:
+        """The number of frames of the query trajectory used in calculating
+        distributions. Defaults to n_frames, and is set for each iteration
+        when run_optimization() is given an n_frames schedule.
+        """
+        if self._query_n_frames is None:
+            return self.n_frames
+        return self._query_n_frames
+
+    @query_n_frames.setter
+    def query_n_frames(self, value: int):
+        self._query_n_frames = value
+
+    @property
+    def topology(self) -> Topology:
+        """Index of the particle groups and molecules of this state.
+
+        Built from the target trajectory on first use and shared by
+        every force and iteration, since the topology never changes.
+        """
+        if self._topology is None:
+            file_path = None
+            if self.save_topology:
+                file_path = self._cache_path("topology.npz")
+            if file_path is not None and os.path.exists(file_path):
+                self._topology = Topology.load(file_path)
+            else:
+                self._topology = Topology.from_frame(self.start_frame)
+                if file_path is not None:
+                    write_atomic(file_path, self._topology.save)
+        return self._topology
+
+    @property
+    def start_frame(self) -> gsd.hoomd.Frame:
+        """The last frame of the target trajectory.
+
+        Query simulations start from this frame. It is read once and
+        shared by every iteration.
+        """
+        if self._start_frame is None:
+            file_path = None
+            if self.save_start_frame:
+                file_path = self._cache_path("start.gsd")
+            if file_path is not None and os.path.exists(file_path):
+                with gsd.hoomd.open(file_path, "r") as traj:
+                    self._start_frame = traj[0]
+            else:
+                with gsd.hoomd.open(self.traj_file, "r") as traj:
+                    self._start_frame = traj[-1]
+                if file_path is not None:
+                    # Move into place once written, see write_atomic
+                    tmp_path = f"{file_path}.{os.getpid()}.tmp"
+                    with gsd.hoomd.open(tmp_path, "w") as traj:
+                        traj.append(self._start_frame)
+                    os.replace(tmp_path, file_path)
+        return self._start_frame
+
     @property
     def alpha(self) -> Union[int, float]:
         """State point weighting value."""
@@ -87,6 +209,94 @@ class State(object):
     def alpha(self, value: float):
         self._alpha = value
 
+    def read_distributions(self, force=None) -> dict:
+        """Read the query distributions saved during the optimization.
+
+        Parameters
+        ----------
+        force : msibi.forces.Force, optional
+            If given, only the distributions of this force are returned.
+
+        Returns
+        -------
+        dict
+            The "iterations" and stacked "distributions" of a force, or
+            a dict of these keyed by each force's class name and name.
+
+        """
+        distributions = read_distributions(self.distribution_file)
+        if force is not None:
+            return distributions[force._key]
+        return distributions
+
+    def _target_distributions(self, forces: list) -> dict:
+        """The unsmoothed target distributions of several forces.
+
+        Distributions not found in the cache are computed in a
+        single pass over the target trajectory.
+
+        Returns
+        -------
+        dict
+            Maps Force._key to the target distribution of each force.
+
+        """
+        distributions = dict()
+        keys = dict()
+        if self.cache_dir is not None:
+            for force in forces:
+                keys[force._key] = self._cache_key(force)
+                cached = load_array(self.cache_dir, keys[force._key])
+                if cached is not None:
+                    distributions[force._key] = cached
+        missing = [f for f in forces if f._key not in distributions]
+        if missing:
+            computed = analyze_trajectory(
+                    gsd_file=self.traj_file,
+                    forces=missing,
+                    exclude_bonded=self.exclude_bonded,
+                    start=-self.n_frames,
+                    topology=self.topology
+            )
+            if self.cache_dir is not None:
+                for force in missing:
+                    save_array(
+                            self.cache_dir,
+                            keys[force._key],
+                            computed[force._key]
+                    )
+            distributions.update(computed)
+        return distributions
+
+    def _trajectory_hash(self) -> str:
+        """The hash of traj_file's contents, computed once."""
+        if self._traj_hash is None:
+            self._traj_hash = file_hash(self.traj_file, self.cache_dir)
+        return self._traj_hash
+
+    def _cache_path(self, file_name: str) -> str:
+        """Path in cache_dir of a file derived from traj_file alone."""
+        key = cache_key(
+                version=__version__,
+                trajectory=self._trajectory_hash(),
+                file_name=file_name
+        )
+        return os.path.join(self.cache_dir, f"{key}-{file_name}")
+
+    def _cache_key(self, force) -> str:
+        """Key of a force's target distribution in the cache."""
+        return cache_key(
+                version=__version__,
+                trajectory=self._trajectory_hash(),
+                force=force._key,
+                x_min=getattr(force, "x_min", None),
+                x_max=getattr(force, "x_max", None),
+                r_cut=getattr(force, "r_cut", None),
+                nbins=force.nbins,
+                n_frames=self.n_frames,
+                exclude_bonded=self.exclude_bonded
+        )
+
     def _run_simulation(
             self,
             n_steps: int,
@@ -99,20 +309,142 @@ class State(object):
             seed: int,
             iteration: int,
             gsd_period: int,
-            backup_trajectories: bool=False
+            backup_trajectories: bool=False,
+            num_cpu_threads: int=None,
+            persistent: bool=False,
+            accumulator: DistributionAccumulator=None,
+            write_trajectory: bool=True,
+            warm_start: bool=False
     ) -> None:
         """Run the hoomd 4 script used to run each query simulation.
         This method is called in msibi.optimize.
 
+        If persistent is True, the Simulation created on the first call
+        is kept and reused by later calls. Its configuration is reset to
+        the starting snapshot, and the forces given on later calls are
+        ignored since MSIBI updates the attached force objects in place.
+
+        If warm_start is True, the simulation starts from the final
+        configuration of the previous query simulation, saved to
+        restart.gsd (or kept by the persistent Simulation), instead of
+        the last frame of the target trajectory.
+
+        Only the last query_n_frames frames, the ones used to compute the
+        query distributions, are written to the query trajectory. If an
+        accumulator is given, the distributions of its forces are
+        accumulated from the same frames and stored for
+        Force._get_state_distribution.
+
         """
-        device = hoomd.device.auto_select()
-        sim = hoomd.simulation.Simulation(device=device)
-        print(f"Starting simulation {iteration} for state {self}")
-        print(f"Running on device {device}")
-
-        with gsd.hoomd.open(self.traj_file, "r") as traj:
-            last_snap = traj[-1]
-        sim.create_state_from_snapshot(last_snap)
+        import hoomd
+
+        from msibi.analysis import InSituAnalysis
+
+        if warm_start and os.path.exists(self.restart_file):
+            with gsd.hoomd.open(self.restart_file, "r") as traj:
+                last_snap = traj[-1]
+        else:
+            last_snap = self.start_frame
+        if persistent and self._sim is not None:
+            sim = self._sim
+            print(f"Continuing simulation {iteration} for state {self}")
+            if not warm_start:
+                sim.state.set_snapshot(
+                        hoomd.Snapshot.from_gsd_frame(
+                            last_snap, sim.device.communicator
+                        )
+                )
+        else:
+            sim = self._create_simulation(
+                    snapshot=last_snap,
+                    forces=forces,
+                    integrator_method=integrator_method,
+                    method_kwargs=method_kwargs,
+                    thermostat=thermostat,
+                    thermostat_kwargs=thermostat_kwargs,
+                    dt=dt,
+                    seed=seed,
+                    num_cpu_threads=num_cpu_threads
+            )
+            if persistent:
+                self._sim = sim
+            print(f"Starting simulation {iteration} for state {self}")
+        print(f"Running on device {sim.device}")
+        writers = []
+        last_step = sim.timestep + n_steps
+        first_step = max(last_step - self.query_n_frames * int(gsd_period), 0)
+        if write_trajectory:
+            # Positions and box (the "property" fields) are all that the
+            # analysis reads from frames after the first.
+            gsd_writer = hoomd.write.GSD(
+                    filename=self.query_traj,
+                    trigger=hoomd.trigger.And([
+                        hoomd.trigger.Periodic(int(gsd_period)),
+                        hoomd.trigger.After(first_step)
+                    ]),
+                    mode="wb",
+                    dynamic=["property"]
+            )
+            writers.append(gsd_writer)
+        if accumulator is not None:
+            # Sample the frames used from the query trajectory
+            analysis_writer = hoomd.write.CustomWriter(
+                    action=InSituAnalysis(accumulator),
+                    trigger=hoomd.trigger.And([
+                        hoomd.trigger.Periodic(int(gsd_period)),
+                        hoomd.trigger.After(first_step)
+                    ])
+            )
+            writers.append(analysis_writer)
+        for writer in writers:
+            sim.operations.writers.append(writer)
+        # Run simulation
+        sim.run(n_steps)
+        if write_trajectory:
+            gsd_writer.flush()
+        # Detach the writers so a persistent simulation starts fresh
+        for writer in writers:
+            sim.operations.writers.remove(writer)
+        if warm_start and not persistent:
+            hoomd.write.GSD.write(
+                    state=sim.state, filename=self.restart_file, mode="wb"
+            )
+        if accumulator is not None:
+            self._query_distributions = accumulator.distributions()
+            self._query_frame_counts = accumulator.frame_counts()
+        else:
+            self._query_distributions = dict()
+            self._query_frame_counts = dict()
+        self._accumulated_in_situ = accumulator is not None
+        if backup_trajectories:
+            shutil.copy(
+                    self.query_traj,
+                    os.path.join(self.dir, f"query{iteration}.gsd")
+            )
+        print(f"Finished simulation {iteration} for state {self}")
+        print()
+
+    def _create_simulation(
+            self,
+            snapshot,
+            forces: list,
+            integrator_method: str,
+            method_kwargs: dict,
+            thermostat: str,
+            thermostat_kwargs: dict,
+            dt: float,
+            seed: int,
+            num_cpu_threads: int=None
+    ) -> hoomd.simulation.Simulation:
+        """Create a hoomd Simulation with its integrator for this state."""
+        import hoomd
+
+        if num_cpu_threads:
+            device = hoomd.device.CPU(num_cpu_threads=num_cpu_threads)
+        else:
+            device = hoomd.device.auto_select()
+        sim = hoomd.simulation.Simulation(device=device, seed=seed)
+        sim.create_state_from_snapshot(snapshot)
         integrator = hoomd.md.Integrator(dt=dt)
         integrator.forces = forces
         thermostat = thermostat(kT=self.kT, **thermostat_kwargs)
@@ -124,23 +456,7 @@ class State(object):
                 )
         )
         sim.operations.add(integrator)
-        #Create GSD writer
-        gsd_writer = hoomd.write.GSD(
-                filename=self.query_traj,
-                trigger=hoomd.trigger.Periodic(int(gsd_period)),
-                mode="wb",
-        )
-        sim.operations.writers.append(gsd_writer)
-        # Run simulation
-        sim.run(n_steps)
-        gsd_writer.flush()
-        if backup_trajectories:
-            shutil.copy(
-                    self.query_traj,
-                    os.path.join(self.dir, f"query{iteration}.gsd")
-            )
-        print(f"Finished simulation {iteration} for state {self}")
-        print()
+        return sim
 
     def _setup_dir(self, name, kT, dir_name=None) -> str:
         """Create a state directory each time a new State is created."""
@@ -0,0 +1,217 @@
+import os
+
+import gsd.hoomd
+import numpy as np
+import pytest
+
+from msibi import Angle, Bond, Dihedral, Pair
+from msibi.analysis import (
+    DistributionAccumulator,
+    Topology,
+    analyze_trajectory,
+    bond_angles,
+    bond_lengths,
+    dihedral_angles,
+    frame_histograms,
+    histogram,
+    minimum_image,
+    molecule_ids
+)
+
+from .base_test import BaseTest, test_assets
+
+
+class TestAnalysis(BaseTest):
+    @pytest.fixture
+    def frame(self):
+        with gsd.hoomd.open(os.path.join(test_assets, "AB-1.0kT.gsd")) as traj:
+            return traj[-1]
+
+    def test_minimum_image(self):
+        box = [10, 10, 10, 0, 0, 0]
+        vectors = np.array([[6.0, -6.0, 1.0], [-9.0, 4.0, 0.0]])
+        wrapped = minimum_image(vectors, box)
+        assert np.allclose(wrapped, [[-4.0, 4.0, 1.0], [1.0, 4.0, 0.0]])
+
+    def test_geometry(self):
+        positions = np.array([
+            [1.0, 0.0, 0.0],
+            [0.0, 0.0, 0.0],
+            [0.0, 1.0, 0.0],
+            [0.0, 1.0, 1.0]
+        ])
+        box = [10, 10, 10, 0, 0, 0]
+        assert np.allclose(bond_lengths(positions, box, np.array([[0, 1]])), 1)
+        angle = bond_angles(positions, box, np.array([[0, 1, 2]]))
+        assert np.allclose(angle, np.pi / 2)
+        dihedral = dihedral_angles(positions, box, np.array([[0, 1, 2, 3]]))
+        assert np.allclose(np.abs(dihedral), np.pi / 2)
+
+    def test_molecule_ids(self, frame):
+        molecules = molecule_ids(frame)
+        assert len(molecules) == frame.particles.N
+        bonds = frame.bonds.group
+        assert np.all(molecules[bonds[:, 0]] == molecules[bonds[:, 1]])
+
+    def test_topology(self, frame):
+        topology = Topology.from_frame(frame)
+        assert topology.types == list(frame.particles.types)
+        bonds = topology.matching_groups("bonds", ["A-B", "B-A"])
+        assert len(bonds) == frame.bonds.N
+        assert np.sum(topology.type_mask("A")) == np.sum(
+            frame.particles.typeid == 0
+        )
+        with pytest.raises(ValueError):
+            topology.matching_groups("angles", ["A-A-A"])
+
+    def test_excluded_pairs(self, frame):
+        topology = Topology.from_frame(frame)
+        bonds = np.sort(frame.bonds.group, axis=1)
+        excluded = topology.excluded_pairs(["bond"])
+        assert np.array_equal(excluded, np.unique(bonds, axis=0))
+        assert np.array_equal(
+            topology.excluded_pairs(["angle"]),
+            topology.excluded_pairs(["1-3"])
+        )
+        assert np.array_equal(
+            topology.excluded_pairs(["dihedral"]),
+            topology.excluded_pairs(["1-4"])
+        )
+        assert topology.excluded_pairs([]).shape == (0, 2)
+        with pytest.raises(ValueError):
+            topology.excluded_pairs(["body"])
+
+    def test_accumulate(self, frame, pairAB):
+        bond = Bond(type1="B", type2="A", optimize=True, nbins=60)
+        bond.set_quadratic(x_min=0.0, x_max=3.0, x0=1, k2=200, k3=0, k4=0)
+        angle = Angle(type1="A", type2="B", type3="A", optimize=True, nbins=60)
+        angle.set_quadratic(x0=2, k4=0, k3=0, k2=100, x_min=0, x_max=np.pi)
+        dihedral = Dihedral(
+            type1="A", type2="B", type3="A", type4="B", optimize=True, nbins=60
+        )
+        dihedral.set_quadratic(
+            x0=0, k4=0, k3=0, k2=10, x_min=-np.pi, x_max=np.pi
+        )
+        forces = [bond, angle, dihedral, pairAB]
+        accumulator = DistributionAccumulator(forces, exclude_bonded=True)
+        accumulator.add_frame(frame)
+        accumulator.add_frame(frame)
+        assert accumulator.n_frames == 2
+        distributions = accumulator.distributions()
+        for force in forces:
+            dist = distributions[force._key]
+            assert dist.shape == (force.nbins + 1, 2)
+        for force in [bond, angle, dihedral]:
+            assert np.isclose(np.sum(distributions[force._key][:, 1]), 1)
+        assert np.all(distributions[pairAB._key][:, 1] >= 0)
+
+    def test_missing_type(self, frame):
+        bond = Bond(type1="A", type2="C", optimize=True, nbins=60)
+        bond.set_quadratic(x_min=0.0, x_max=3.0, x0=1, k2=200, k3=0, k4=0)
+        accumulator = DistributionAccumulator([bond])
+        with pytest.raises(ValueError):
+            accumulator.add_frame(frame)
+
+    def test_analyze_trajectory(self, pairAB):
+        gsd_file = os.path.join(test_assets, "AB-1.0kT.gsd")
+        bond = Bond(type1="A", type2="B", optimize=True, nbins=60)
+        bond.set_quadratic(x_min=0.0, x_max=3.0, x0=1, k2=200, k3=0, k4=0)
+        angle = Angle(type1="B", type2="A", type3="B", optimize=True, nbins=60)
+        angle.set_quadratic(x0=2, k4=0, k3=0, k2=100, x_min=0, x_max=np.pi)
+        together = analyze_trajectory(
+            gsd_file, [bond, angle, pairAB], start=-5, stop=-1
+        )
+        for force in [bond, angle, pairAB]:
+            alone = analyze_trajectory(gsd_file, [force], start=-5, stop=-1)
+            assert np.allclose(alone[force._key], together[force._key])
+
+    @pytest.mark.parametrize("types", [("A", "B"), ("A", "A")])
+    def test_pair_distribution(self, stateX, types):
+        pair = Pair(
+            type1=types[0], type2=types[1], r_cut=3.0, nbins=60, optimize=True
+        )
+        pair.set_lj(sigma=1.5, epsilon=1, r_cut=3.0, r_min=0.1)
+        dist = pair._get_distribution(stateX, stateX.traj_file, n_frames=5)
+        # Reference: g(r) from all A-B distances, counting only pairs in
+        # different molecules, scaled by the fraction of pairs kept in
+        # the last frame
+        topology = stateX.topology
+        A = topology.type_mask(pair.type1)
+        B = topology.type_mask(pair.type2)
+        same_molecule = (
+            topology.molecule_ids[B][:, None] == topology.molecule_ids[A]
+        )
+        edges = np.linspace(pair.x_min, pair.r_cut, pair.nbins + 2)
+        shells = 4 / 3 * np.pi * np.diff(edges ** 3)
+        counts = np.zeros(pair.nbins + 1)
+        with gsd.hoomd.open(stateX.traj_file) as traj:
+            frames = traj[-5:]
+            for frame in frames:
+                pos = frame.particles.position
+                box = frame.configuration.box
+                r = np.linalg.norm(
+                    minimum_image(pos[B][:, None] - pos[A], box), axis=-1
+                )
+                neighbors = (r > 0) & (r < pair.r_cut)
+                kept = neighbors & ~same_molecule
+                counts += np.histogram(r[kept], bins=edges)[0]
+            fraction = kept.sum() / neighbors.sum()
+            density = A.sum() / np.prod(box[:3])
+        reference = counts / (len(frames) * B.sum() * density * shells)
+        assert np.allclose(dist[:, 1], reference * fraction, atol=1e-4)
+
+    def test_histogram(self):
+        values = np.random.uniform(-1, 4, 1000)
+        values = np.append(values, [0.0, 3.0])
+        counts = histogram(values, bins=61, x_range=(0, 3))
+        assert np.array_equal(
+            counts, np.histogram(values, bins=61, range=(0, 3))[0]
+        )
+
+    def test_frame_histograms(self):
+        values = np.random.uniform(-1, 4, (5, 200))
+        counts = frame_histograms(values, bins=61, x_range=(0, 3))
+        assert counts.shape == (5, 61)
+        for row, row_counts in zip(values, counts):
+            assert np.array_equal(row_counts, histogram(row, 61, (0, 3)))
+
+    def test_frame_counts(self, angle, pairAB):
+        angle.set_quadratic(x0=2, k4=0, k3=0, k2=100, x_min=0, x_max=np.pi)
+        gsd_file = os.path.join(test_assets, "AB-4.0kT.gsd")
+        accumulator = DistributionAccumulator(
+            [angle, pairAB], keep_frames=True
+        )
+        accumulator.add_trajectory(gsd_file, start=-5, stop=-1)
+        frame_counts = accumulator.frame_counts()
+        for force in [angle, pairAB]:
+            assert frame_counts[force._key].shape == (4, force.nbins + 1)
+        assert np.array_equal(
+            frame_counts[pairAB._key].sum(axis=0),
+            accumulator._specs[1]["rdf"].bin_counts
+        )
+        assert DistributionAccumulator([angle]).frame_counts() == {}
+
+    def test_batch_geometry(self):
+        gsd_file = os.path.join(test_assets, "AB-4.0kT.gsd")
+        with gsd.hoomd.open(gsd_file) as traj:
+            frames = [traj[i] for i in range(-5, 0)]
+        positions = np.stack([f.particles.position for f in frames])
+        boxes = np.stack([f.configuration.box for f in frames])
+        for func, groups in [
+            (bond_lengths, frames[0].bonds.group),
+            (bond_angles, frames[0].angles.group),
+            (dihedral_angles, frames[0].dihedrals.group)
+        ]:
+            batch = func(positions, boxes, groups)
+            single = [
+                func(f.particles.position, f.configuration.box, groups)
+                for f in frames
+            ]
+            assert np.allclose(batch, np.stack(single))
+
+    def test_batch_size(self, angle):
+        angle.set_quadratic(x0=2, k4=0, k3=0, k2=100, x_min=0, x_max=np.pi)
+        gsd_file = os.path.join(test_assets, "AB-4.0kT.gsd")
+        dist1 = analyze_trajectory(gsd_file, [angle], batch_size=1)
+        dist2 = analyze_trajectory(gsd_file, [angle], batch_size=7)
+        assert np.allclose(dist1[angle._key], dist2[angle._key])
@@ -105,6 +105,40 @@ class TestForce(BaseTest):
         angle._add_state(stateX)
         angle.plot_target_distribution(state=stateX)
 
+    def test_target_resmoothing(self, stateX, monkeypatch):
+        angle = Angle(type1="A", type2="B", type3="A", optimize=True, nbins=60)
+        angle.set_quadratic(x0=2, k4=0, k3=0, k2=100, x_min=0, x_max=np.pi)
+        angle._add_state(stateX)
+        assert angle._states[stateX]["target_distribution"] is None
+        target = np.copy(angle.target_distribution(stateX))
+        raw = angle._states[stateX]["raw_target_distribution"]
+
+        def no_trajectory(forces):
+            raise AssertionError("The target trajectory was read again.")
+
+        monkeypatch.setattr(stateX, "_target_distributions", no_trajectory)
+        angle.smoothing_window = 5
+        angle.smoothing_order = 2
+        smoothed = angle.target_distribution(stateX)
+        assert angle._states[stateX]["raw_target_distribution"] is raw
+        assert not np.allclose(smoothed[:, 1], target[:, 1])
+        monkeypatch.undo()
+        angle.nbins = 50
+        assert angle._states[stateX]["raw_target_distribution"] is None
+        assert angle.target_distribution(stateX).shape == (51, 2)
+
+    def test_user_target(self, msibi, stateX):
+        bond = Bond(type1="A", type2="B", optimize=True, nbins=60)
+        bond.set_quadratic(x_min=0.0, x_max=3.0, x0=1, k2=200, k3=0, k4=0)
+        msibi.add_state(stateX)
+        msibi.add_force(bond)
+        x = bond.x_range
+        target = np.vstack([x, np.full_like(x, 1 / len(x))]).T
+        bond.set_target_distribution(stateX, target)
+        msibi._compute_target_distributions()
+        bond.smoothing_window = 5
+        assert bond.target_distribution(stateX) is target
+
     def test_static_warnings(self):
         bond = Bond(type1="A", type2="B", optimize=False)
         bond.set_harmonic(k=500, r0=2)
@@ -1,9 +1,13 @@
+import os
+
+import gsd.hoomd
 import numpy as np
 import pytest
 import hoomd
-from msibi import MSIBI, Bond, Angle, Dihedral, Pair
+from msibi import MSIBI, Bond, Angle, Dihedral, Pair, State
+from msibi.utils.schedules import AdaptiveSchedule
 
-from .base_test import BaseTest
+from .base_test import BaseTest, test_assets
 
 
 
@@ -54,6 +58,438 @@ class TestMSIBI(BaseTest):
         assert len(bond._head_correction_history) == 1
         assert len(bond._tail_correction_history) == 1
         assert len(bond._learned_potential_history) == 1
+        assert bond._key in stateX._query_distributions
+
+    def test_run_parallel(self, tmp_path):
+        potentials = []
+        for n_workers in [1, 2]:
+            run_dir = os.path.join(tmp_path, f"workers{n_workers}")
+            os.mkdir(run_dir)
+            msibi = MSIBI(
+                nlist=hoomd.md.nlist.Cell,
+                integrator_method=hoomd.md.methods.ConstantVolume,
+                thermostat=hoomd.md.methods.thermostats.MTTK,
+                method_kwargs={},
+                thermostat_kwargs={"tau": 0.01},
+                dt=0.003,
+                gsd_period=10,
+                n_workers=n_workers,
+                threads_per_worker=1
+            )
+            for name, kT in [("X", 1.0), ("Y", 4.0)]:
+                msibi.add_state(
+                    State(
+                        name=name,
+                        kT=kT,
+                        traj_file=os.path.join(test_assets, f"AB-{kT}kT.gsd"),
+                        n_frames=10,
+                        _dir=run_dir
+                    )
+                )
+            bond = Bond(type1="A", type2="B", optimize=True, nbins=60)
+            bond.set_quadratic(x_min=0.0, x_max=3.0, x0=1, k2=200, k3=0, k4=0)
+            msibi.add_force(bond)
+            msibi.run_optimization(n_steps=500, n_iterations=2)
+            assert msibi.n_iterations == 2
+            potentials.append(np.copy(bond.potential))
+        assert np.array_equal(potentials[0], potentials[1])
+
+    def test_run_persistent(self, stateX, stateY):
+        msibi = MSIBI(
+            nlist=hoomd.md.nlist.Cell,
+            integrator_method=hoomd.md.methods.ConstantVolume,
+            thermostat=hoomd.md.methods.thermostats.MTTK,
+            method_kwargs={},
+            thermostat_kwargs={"tau": 0.01},
+            dt=0.003,
+            gsd_period=10,
+            persistent_simulations=True
+        )
+        bond = Bond(type1="A", type2="B", optimize=True, nbins=60)
+        bond.set_quadratic(x_min=0.0, x_max=3.0, x0=1, k2=200, k3=0, k4=0)
+        msibi.add_state(stateX)
+        msibi.add_state(stateY)
+        msibi.add_force(bond)
+        msibi.run_optimization(n_steps=500, n_iterations=1)
+        sim = stateX._sim
+        assert sim is not None
+        msibi.run_optimization(n_steps=500, n_iterations=1)
+        assert stateX._sim is sim
+        bond_force = sim.operations.integrator.forces[0]
+        assert np.allclose(bond_force.params[bond.name]["U"], bond.potential)
+        assert len(bond.potential_history) == 4
+
+    def test_run_in_situ(self, stateX, stateY):
+        msibi = MSIBI(
+            nlist=hoomd.md.nlist.Cell,
+            integrator_method=hoomd.md.methods.ConstantVolume,
+            thermostat=hoomd.md.methods.thermostats.MTTK,
+            method_kwargs={},
+            thermostat_kwargs={"tau": 0.01},
+            dt=0.003,
+            gsd_period=10,
+            in_situ_analysis=True,
+            write_query_trajectory=False
+        )
+        bond = Bond(type1="A", type2="B", optimize=True, nbins=60)
+        bond.set_quadratic(x_min=0.0, x_max=3.0, x0=1, k2=200, k3=0, k4=0)
+        msibi.add_state(stateX)
+        msibi.add_state(stateY)
+        msibi.add_force(bond)
+        init_bond_pot = np.copy(bond.potential)
+        msibi.run_optimization(n_steps=500, n_iterations=1)
+        assert not os.path.exists(stateX.query_traj)
+        assert bond._key in stateX._query_distributions
+        assert not np.array_equal(bond.potential, init_bond_pot)
+        assert len(bond.distribution_history(state=stateX)) == 1
+        assert len(bond._states[stateX]["f_fit"]) == 1
+
+    @pytest.mark.parametrize("update_schedule", ["simultaneous", "alternating"])
+    def test_run_joint(self, stateX, stateY, update_schedule):
+        msibi = MSIBI(
+            nlist=hoomd.md.nlist.Cell,
+            integrator_method=hoomd.md.methods.ConstantVolume,
+            thermostat=hoomd.md.methods.thermostats.MTTK,
+            method_kwargs={},
+            thermostat_kwargs={"tau": 0.01},
+            dt=0.003,
+            gsd_period=10,
+            update_schedule=update_schedule
+        )
+        bond = Bond(type1="A", type2="B", optimize=True, nbins=60)
+        bond.set_quadratic(x_min=0.0, x_max=3.0, x0=1, k2=200, k3=0, k4=0)
+        angle = Angle(type1="A", type2="B", type3="A", optimize=True, nbins=60)
+        angle.set_quadratic(x0=2, k4=0, k3=0, k2=100, x_min=0, x_max=np.pi)
+        msibi.add_state(stateX)
+        msibi.add_state(stateY)
+        msibi.add_force(bond)
+        msibi.add_force(angle)
+        msibi.run_optimization(n_steps=500, n_iterations=3)
+        assert len(msibi._build_force_objects()) == 2
+        assert len(bond._states[stateX]["f_fit"]) == 3
+        assert len(angle._states[stateX]["f_fit"]) == 3
+        if update_schedule == "simultaneous":
+            assert len(bond.distribution_history(state=stateX)) == 3
+            assert len(angle.distribution_history(state=stateX)) == 3
+        else:
+            assert len(bond.distribution_history(state=stateX)) == 2
+            assert len(angle.distribution_history(state=stateX)) == 1
+
+    def test_run_early_stopping(self, stateX, stateY):
+        msibi = MSIBI(
+            nlist=hoomd.md.nlist.Cell,
+            integrator_method=hoomd.md.methods.ConstantVolume,
+            thermostat=hoomd.md.methods.thermostats.MTTK,
+            method_kwargs={},
+            thermostat_kwargs={"tau": 0.01},
+            dt=0.003,
+            gsd_period=10,
+            min_improvement=1.0,
+            convergence_window=1
+        )
+        bond = Bond(type1="A", type2="B", optimize=True, nbins=60)
+        bond.set_quadratic(x_min=0.0, x_max=3.0, x0=1, k2=200, k3=0, k4=0)
+        msibi.add_state(stateX)
+        msibi.add_state(stateY)
+        msibi.add_force(bond)
+        msibi.run_optimization(n_steps=500, n_iterations=5)
+        assert msibi.n_iterations == 2
+        assert msibi.stop_reason.startswith("min_improvement")
+        msibi.min_improvement = None
+        msibi.f_fit_target = 1e-6
+        msibi.run_optimization(n_steps=500, n_iterations=5)
+        assert msibi.n_iterations == 3
+        assert msibi.stop_reason.startswith("f_fit_target")
+        assert len(bond._states[stateX]["f_fit"]) == 3
+
+    def test_run_freezing(self, stateX, stateY):
+        msibi = MSIBI(
+            nlist=hoomd.md.nlist.Cell,
+            integrator_method=hoomd.md.methods.ConstantVolume,
+            thermostat=hoomd.md.methods.thermostats.MTTK,
+            method_kwargs={},
+            thermostat_kwargs={"tau": 0.01},
+            dt=0.003,
+            gsd_period=10,
+            f_fit_target=1e-6,
+            freeze_converged=True,
+            freeze_check_period=1
+        )
+        bond = Bond(type1="A", type2="B", optimize=True, nbins=60)
+        bond.set_quadratic(x_min=0.0, x_max=3.0, x0=1, k2=200, k3=0, k4=0)
+        msibi.add_state(stateX)
+        msibi.add_state(stateY)
+        msibi.add_force(bond)
+        msibi.run_optimization(n_steps=500, n_iterations=3)
+        assert msibi.frozen_forces == [bond]
+        assert msibi.n_iterations == 1
+        assert msibi.stop_reason.startswith("freeze_converged")
+        frozen_potential = np.copy(bond.potential)
+        # The frozen bond is checked, found to drift and optimized again
+        msibi.f_fit_target = 1.0
+        msibi.freeze_tolerance = -1.0
+        msibi.run_optimization(n_steps=500, n_iterations=1)
+        assert msibi.frozen_forces == []
+        assert np.array_equal(bond.potential, frozen_potential)
+        assert len(bond._states[stateX]["f_fit"]) == 2
+        msibi.run_optimization(n_steps=500, n_iterations=1)
+        assert not np.array_equal(bond.potential, frozen_potential)
+
+    def test_run_all_frozen(self, stateX, stateY):
+        msibi = MSIBI(
+            nlist=hoomd.md.nlist.Cell,
+            integrator_method=hoomd.md.methods.ConstantVolume,
+            thermostat=hoomd.md.methods.thermostats.MTTK,
+            method_kwargs={},
+            thermostat_kwargs={"tau": 0.01},
+            dt=0.003,
+            gsd_period=10,
+            f_fit_target=1e-6,
+            freeze_converged=True,
+            freeze_check_period=2,
+            in_situ_analysis=True,
+            write_query_trajectory=False
+        )
+        bond = Bond(type1="A", type2="B", optimize=True, nbins=60)
+        bond.set_quadratic(x_min=0.0, x_max=3.0, x0=1, k2=200, k3=0, k4=0)
+        msibi.add_state(stateX)
+        msibi.add_state(stateY)
+        msibi.add_force(bond)
+        msibi.run_optimization(n_steps=500, n_iterations=3)
+        assert msibi.frozen_forces == [bond]
+        # Nothing is analyzed or updated until the frozen bond is checked
+        msibi.run_optimization(n_steps=500, n_iterations=3)
+        assert msibi.n_iterations == 1
+        assert msibi.stop_reason.startswith("freeze_converged")
+        assert len(bond._states[stateX]["f_fit"]) == 1
+        msibi.n_iterations = 2
+        msibi.run_optimization(n_steps=500, n_iterations=1)
+        assert stateX._accumulated_in_situ
+        assert len(bond._states[stateX]["f_fit"]) == 2
+
+    def test_run_reweighting(self, stateX, stateY):
+        msibi = MSIBI(
+            nlist=hoomd.md.nlist.Cell,
+            integrator_method=hoomd.md.methods.ConstantVolume,
+            thermostat=hoomd.md.methods.thermostats.MTTK,
+            method_kwargs={},
+            thermostat_kwargs={"tau": 0.01},
+            dt=0.003,
+            gsd_period=10,
+            reweight_updates=2,
+            min_effective_samples=1e-3
+        )
+        bond = Bond(type1="A", type2="B", optimize=True, nbins=60)
+        bond.set_quadratic(x_min=0.0, x_max=3.0, x0=1, k2=200, k3=0, k4=0)
+        msibi.add_state(stateX)
+        msibi.add_state(stateY)
+        msibi.add_force(bond)
+        msibi.run_optimization(n_steps=500, n_iterations=1)
+        frame_counts = stateX._query_frame_counts[bond._key]
+        assert frame_counts.shape == (stateX.n_frames, 61)
+        assert msibi.n_iterations == 1
+        # Reweighted estimates are kept apart from the measured fits
+        assert len(bond._states[stateX]["f_fit"]) == 1
+        assert len(bond._states[stateX]["reweighted_f_fit"]) == 2
+        assert len(bond.distribution_history(state=stateX)) == 1
+        assert len(bond.potential_history) == 6
+
+    def test_reweighting_pairs(self, stateX):
+        msibi = MSIBI(
+            nlist=hoomd.md.nlist.Cell,
+            integrator_method=hoomd.md.methods.ConstantVolume,
+            thermostat=hoomd.md.methods.thermostats.MTTK,
+            method_kwargs={},
+            thermostat_kwargs={"tau": 0.01},
+            dt=0.003,
+            gsd_period=10,
+            reweight_updates=2
+        )
+        pair = Pair(
+                type1="A",
+                type2="B",
+                r_cut=3.0,
+                nbins=100,
+                optimize=True,
+                exclude_bonded=True
+        )
+        pair.set_lj(sigma=1.5, epsilon=1, r_cut=3.0, r_min=0.1)
+        msibi.add_state(stateX)
+        msibi.add_force(pair)
+        # Pairs within a chain beyond 1-3 feel the pair potential
+        # but are left out of the RDF
+        with pytest.raises(ValueError):
+            msibi.run_optimization(n_steps=500, n_iterations=1)
+        msibi.nlist_exclusions = []
+        stateX.exclude_bonded = False
+        msibi._check_pair_reweighting()
+
+    @pytest.mark.parametrize("update_method", ["imc", "anderson"])
+    def test_run_update_method(self, msibi, stateX, stateY, update_method):
+        msibi.gsd_period = 10
+        bond = Bond(
+            type1="A",
+            type2="B",
+            optimize=True,
+            nbins=60,
+            update_method=update_method
+        )
+        bond.set_quadratic(x_min=0.0, x_max=3.0, x0=1, k2=200, k3=0, k4=0)
+        msibi.add_state(stateX)
+        msibi.add_state(stateY)
+        msibi.add_force(bond)
+        init_bond_pot = np.copy(bond.potential)
+        msibi.run_optimization(n_steps=500, n_iterations=2)
+        assert not np.array_equal(bond.potential, init_bond_pot)
+        assert np.all(np.isfinite(bond.potential))
+        assert len(bond._states[stateX]["f_fit"]) == 2
+
+    def test_query_window(self, msibi, stateX, stateY):
+        msibi.gsd_period = 10
+        bond = Bond(type1="A", type2="B", optimize=True, nbins=60)
+        bond.set_quadratic(x_min=0.0, x_max=3.0, x0=1, k2=200, k3=0, k4=0)
+        msibi.add_state(stateX)
+        msibi.add_state(stateY)
+        msibi.add_force(bond)
+        msibi.run_optimization(n_steps=500, n_iterations=1)
+        with gsd.hoomd.open(stateX.query_traj) as traj:
+            assert len(traj) == stateX.n_frames
+            steps = traj[-1].configuration.step - traj[0].configuration.step
+            assert steps == (stateX.n_frames - 1) * 10
+        with gsd.hoomd.open(stateY.query_traj) as traj:
+            # Fewer steps than n_frames * gsd_period: every frame is written
+            assert len(traj) == 50
+
+    def test_run_schedule(self, msibi, stateX, stateY):
+        msibi.gsd_period = 10
+        bond = Bond(type1="A", type2="B", optimize=True, nbins=60)
+        bond.set_quadratic(x_min=0.0, x_max=3.0, x0=1, k2=200, k3=0, k4=0)
+        msibi.add_state(stateX)
+        msibi.add_state(stateY)
+        msibi.add_force(bond)
+        msibi.run_optimization(
+            n_steps=[200, 400], n_iterations=2, n_frames=lambda i: 5 + 10 * i
+        )
+        assert stateX.query_n_frames == 15
+        assert stateX.n_frames == 10
+        with gsd.hoomd.open(stateX.query_traj) as traj:
+            assert len(traj) == 15
+        assert bond._key in stateX._query_distributions
+        assert len(bond._states[stateX]["f_fit"]) == 2
+        msibi.run_optimization(
+            n_steps=AdaptiveSchedule(start=200, stop=1000), n_iterations=1
+        )
+        assert msibi.n_iterations == 3
+        assert stateX.query_n_frames == stateX.n_frames
+        with gsd.hoomd.open(stateX.query_traj) as traj:
+            assert len(traj) == stateX.n_frames
+
+    def test_run_warm_start(self, stateX, stateY):
+        msibi = MSIBI(
+            nlist=hoomd.md.nlist.Cell,
+            integrator_method=hoomd.md.methods.ConstantVolume,
+            thermostat=hoomd.md.methods.thermostats.MTTK,
+            method_kwargs={},
+            thermostat_kwargs={"tau": 0.01},
+            dt=0.003,
+            gsd_period=10,
+            warm_start=True
+        )
+        bond = Bond(type1="A", type2="B", optimize=True, nbins=60)
+        bond.set_quadratic(x_min=0.0, x_max=3.0, x0=1, k2=200, k3=0, k4=0)
+        msibi.add_state(stateX)
+        msibi.add_state(stateY)
+        msibi.add_force(bond)
+        msibi.run_optimization(n_steps=500, n_iterations=1)
+        with gsd.hoomd.open(stateX.restart_file) as traj:
+            restart_pos = traj[-1].particles.position
+        with gsd.hoomd.open(stateX.traj_file) as traj:
+            target_pos = traj[-1].particles.position
+        assert restart_pos.shape == target_pos.shape
+        assert not np.allclose(restart_pos, target_pos)
+        msibi.run_optimization(n_steps=500, n_iterations=1)
+        assert len(bond._states[stateX]["f_fit"]) == 2
+
+    def test_checkpoint_resume(self, tmp_path, stateX, stateY):
+        checkpoint = os.path.join(tmp_path, "msibi.pkl")
+        msibi = MSIBI(
+            nlist=hoomd.md.nlist.Cell,
+            integrator_method=hoomd.md.methods.ConstantVolume,
+            thermostat=hoomd.md.methods.thermostats.MTTK,
+            method_kwargs={},
+            thermostat_kwargs={"tau": 0.01},
+            dt=0.003,
+            gsd_period=10,
+            checkpoint_file=checkpoint
+        )
+        bond = Bond(type1="A", type2="B", optimize=True, nbins=60)
+        bond.set_quadratic(x_min=0.0, x_max=3.0, x0=1, k2=200, k3=0, k4=0)
+        msibi.add_state(stateX)
+        msibi.add_state(stateY)
+        msibi.add_force(bond)
+        msibi.run_optimization(n_steps=500, n_iterations=2)
+        # Nothing is left to run from the finished call
+        resumed = MSIBI.resume(checkpoint)
+        assert resumed.n_iterations == 2
+        resumed_bond = resumed._optimize_forces[0]
+        assert np.array_equal(resumed_bond.potential, bond.potential)
+        assert len(resumed_bond.potential_history) == len(bond.potential_history)
+        for state in resumed.states:
+            assert state._opt is resumed
+            assert state in resumed_bond._states
+        resumed = MSIBI.resume(checkpoint, n_iterations=1)
+        assert resumed.n_iterations == 3
+        resumed_bond = resumed._optimize_forces[0]
+        resumed_state = resumed.states[0]
+        assert len(resumed_bond._states[resumed_state]["f_fit"]) == 3
+
+    def test_history_storage(self, tmp_path, stateX, stateY):
+        history_dir = os.path.join(tmp_path, "history")
+        msibi = MSIBI(
+            nlist=hoomd.md.nlist.Cell,
+            integrator_method=hoomd.md.methods.ConstantVolume,
+            thermostat=hoomd.md.methods.thermostats.MTTK,
+            method_kwargs={},
+            thermostat_kwargs={"tau": 0.01},
+            dt=0.003,
+            gsd_period=10,
+            history_dir=history_dir,
+            history_in_memory=1
+        )
+        bond = Bond(type1="A", type2="B", optimize=True, nbins=60)
+        bond.set_quadratic(x_min=0.0, x_max=3.0, x0=1, k2=200, k3=0, k4=0)
+        msibi.add_state(stateX)
+        msibi.add_state(stateY)
+        msibi.add_force(bond)
+        msibi.run_optimization(n_steps=500, n_iterations=2)
+        assert len(bond.potential_history) == 4
+        assert len(bond.potential_history._entries) == 1
+        assert len(bond.distribution_history(stateX)) == 2
+        assert np.array(bond.potential_history).shape == (4, 61)
+        bond.save_potential_history(os.path.join(tmp_path, "pot.npy"))
+        assert np.load(os.path.join(tmp_path, "pot.npy")).shape == (4, 61)
+        assert len(os.listdir(history_dir)) == 6
+
+    def test_distribution_output(self, msibi, stateX, stateY):
+        msibi.gsd_period = 10
+        bond = Bond(type1="A", type2="B", optimize=True, nbins=60)
+        bond.set_quadratic(x_min=0.0, x_max=3.0, x0=1, k2=200, k3=0, k4=0)
+        msibi.add_state(stateX)
+        msibi.add_state(stateY)
+        msibi.add_force(bond)
+        msibi.run_optimization(n_steps=500, n_iterations=2)
+        distributions = stateX.read_distributions(bond)
+        assert np.array_equal(distributions["iterations"], [0, 1])
+        assert np.allclose(
+            distributions["distributions"][-1],
+            bond.distribution_history(stateX)[-1]
+        )
+        assert not any(f.endswith(".txt") for f in os.listdir(stateX.dir))
+        msibi.save_distribution_text = True
+        msibi.run_optimization(n_steps=500, n_iterations=1)
+        assert os.path.exists(
+            os.path.join(stateX.dir, "dist_A-B-state_X-step_2.txt")
+        )
 
     def test_run_with_static_force(self, msibi, stateX, stateY):
         msibi.gsd_period = 10
@@ -109,11 +545,90 @@ class TestMSIBI(BaseTest):
         with pytest.raises(RuntimeError):
             msibi.pickle_forces(file_path="test.pkl")
 
-        bond = Bond(type1="A", type2="B", optimize=True, nbins=60)
-        angle = Angle(type1="A", type2="B", type3="A", optimize=True, nbins=60)
-        with pytest.raises(RuntimeError):
-            msibi.add_force(bond)
-            msibi.add_force(angle)
+        with pytest.raises(ValueError):
+            msibi = MSIBI(
+                nlist=hoomd.md.nlist.Cell,
+                integrator_method=hoomd.md.methods.ConstantVolume,
+                method_kwargs=dict(),
+                thermostat=hoomd.md.methods.thermostats.MTTK,
+                thermostat_kwargs=dict(tau=0.01),
+                dt=0.003,
+                gsd_period=int(1e3),
+                update_schedule="random"
+            )
+
+        with pytest.raises(ValueError):
+            msibi = MSIBI(
+                nlist=hoomd.md.nlist.Cell,
+                integrator_method=hoomd.md.methods.ConstantVolume,
+                method_kwargs=dict(),
+                thermostat=hoomd.md.methods.thermostats.MTTK,
+                thermostat_kwargs=dict(tau=0.01),
+                dt=0.003,
+                gsd_period=int(1e3),
+                f_fit_target=1.5
+            )
+
+        with pytest.raises(ValueError):
+            msibi = MSIBI(
+                nlist=hoomd.md.nlist.Cell,
+                integrator_method=hoomd.md.methods.ConstantVolume,
+                method_kwargs=dict(),
+                thermostat=hoomd.md.methods.thermostats.MTTK,
+                thermostat_kwargs=dict(tau=0.01),
+                dt=0.003,
+                gsd_period=int(1e3),
+                freeze_converged=True
+            )
+
+        with pytest.raises(ValueError):
+            msibi = MSIBI(
+                nlist=hoomd.md.nlist.Cell,
+                integrator_method=hoomd.md.methods.ConstantVolume,
+                method_kwargs=dict(),
+                thermostat=hoomd.md.methods.thermostats.MTTK,
+                thermostat_kwargs=dict(tau=0.01),
+                dt=0.003,
+                gsd_period=int(1e3),
+                n_workers=0
+            )
+
+        with pytest.raises(ValueError):
+            msibi = MSIBI(
+                nlist=hoomd.md.nlist.Cell,
+                integrator_method=hoomd.md.methods.ConstantVolume,
+                method_kwargs=dict(),
+                thermostat=hoomd.md.methods.thermostats.MTTK,
+                thermostat_kwargs=dict(tau=0.01),
+                dt=0.003,
+                gsd_period=int(1e3),
+                n_workers=2,
+                persistent_simulations=True
+            )
+
+        with pytest.raises(ValueError):
+            msibi = MSIBI(
+                nlist=hoomd.md.nlist.Cell,
+                integrator_method=hoomd.md.methods.ConstantVolume,
+                method_kwargs=dict(),
+                thermostat=hoomd.md.methods.thermostats.MTTK,
+                thermostat_kwargs=dict(tau=0.01),
+                dt=0.003,
+                gsd_period=int(1e3),
+                write_query_trajectory=False
+            )
+
+        with pytest.raises(ValueError):
+            msibi = MSIBI(
+                nlist=hoomd.md.nlist.Cell,
+                integrator_method=hoomd.md.methods.ConstantVolume,
+                method_kwargs=dict(),
+                thermostat=hoomd.md.methods.thermostats.MTTK,
+                thermostat_kwargs=dict(tau=0.01),
+                dt=0.003,
+                gsd_period=int(1e3),
+                reweight_updates=-1
+            )
 
         with pytest.raises(ValueError):
             msibi = MSIBI(
@@ -1,7 +1,54 @@
+import more_itertools as mit
 import numpy as np
 import pytest
 
-from msibi.potentials import alpha_array, pair_tail_correction, pair_head_correction, mie
+from msibi.potentials import (
+    alpha_array,
+    bond_correction,
+    exponential_fit,
+    exponential_tail_correction,
+    linear_fit,
+    linear_head_correction_optimized,
+    linear_tail_correction_optimized,
+    linear_head_correction,
+    linear_tail_correction,
+    pair_correction,
+    pair_tail_correction,
+    pair_head_correction,
+    mie,
+    repair_potentials
+)
+
+
+def _loop_repair(V):
+    """The original loop based repair, used as a reference."""
+    V = np.copy(V)
+    real_idx = np.where(np.isfinite(V))[0]
+    if not np.all(np.ediff1d(real_idx) == 1):
+        start = real_idx[0]
+        end = real_idx[-1]
+        for idx, v in enumerate(V[start:end]):
+            if not np.isfinite(v):
+                avg = (V[idx + start - 1] + V[idx + start + 1]) / 2
+                V[idx + start] = avg
+        _real_idx = np.where(np.isfinite(V))[0]
+        real_idx = max(
+            [list(g) for g in mit.consecutive_groups(_real_idx)], key=len
+        )
+    return V, real_idx
+
+
+def _random_potentials(n_potentials=200, n_points=40, seed=12):
+    rng = np.random.default_rng(seed)
+    V = rng.normal(size=(n_potentials, n_points))
+    values = np.array([np.nan, np.inf, -np.inf])
+    for row in V:
+        n_bad = rng.integers(1, n_points // 2)
+        row[rng.choice(n_points, n_bad, replace=False)] = rng.choice(
+            values, n_bad
+        )
+        row[rng.integers(n_points)] = 1.0
+    return V
 
 
 def test_tail_correction():
@@ -42,3 +89,101 @@ def test_head_correction():
     assert not np.isnan(exp_V).any() and not np.isinf(exp_V).any()
     assert all(exp_V[cutoff:] == V[cutoff:])
     assert exp_V[0] > linear_V[0]
+
+
+def test_repair_potentials():
+    potentials = _random_potentials()
+    batch_V, first, last = repair_potentials(potentials)
+    for V, batch_row, row_first, row_last in zip(
+            potentials, batch_V, first, last
+    ):
+        expected_V, expected_idx = _loop_repair(V)
+        np.testing.assert_array_equal(batch_row, expected_V)
+        assert row_first == expected_idx[0]
+        assert row_last == expected_idx[-1]
+        single_V, single_first, single_last = repair_potentials(V)
+        np.testing.assert_array_equal(single_V, expected_V)
+        assert (single_first, single_last) == (row_first, row_last)
+    with pytest.raises(ValueError):
+        repair_potentials(np.full(10, np.nan))
+
+
+def test_corrections_unchanged():
+    r = np.linspace(0.1, 3, 40)
+    for V in _random_potentials(50):
+        V[:12] = np.linspace(5, 1, 12)
+        V[-12:] = np.linspace(1, 0.1, 12)
+        V[15] = np.nan
+        V[20:22] = np.inf
+        repaired, real_idx = _loop_repair(V)
+        head, tail = real_idx[0] - 1, real_idx[-1] + 1
+        for correction, kwargs in [
+            (pair_correction, dict(r_switch=2.5)), (bond_correction, dict())
+        ]:
+            new_V, real, head_cut, tail_cut = correction(
+                r, np.copy(V), "linear", **kwargs
+            )
+            assert np.array_equal(real, real_idx)
+            assert (head_cut, tail_cut) == (head, tail)
+            expected = linear_head_correction(r, np.copy(repaired), head)
+            if correction is bond_correction:
+                expected = linear_tail_correction(r, expected, tail)
+            else:
+                expected = pair_tail_correction(r, expected, 2.5)
+            np.testing.assert_array_equal(new_V, expected)
+
+
+def test_linear_fit():
+    rng = np.random.default_rng(3)
+    x = np.linspace(0, 2, 10)
+    y = rng.normal(size=(5, 10)) + 3 * x - 1
+    slopes, intercepts = linear_fit(np.broadcast_to(x, y.shape), y)
+    for row, slope, intercept in zip(y, slopes, intercepts):
+        assert np.allclose((slope, intercept), np.polyfit(x, row, 1))
+        assert np.allclose(linear_fit(x, row), (slope, intercept))
+
+
+def test_exponential_fit():
+    x = np.linspace(1, 2, 8)
+    A, B = exponential_fit(x, 0.5 * np.exp(2 * x))
+    assert np.allclose((A, B), (0.5, 2))
+    A, B = exponential_fit(x, -3 * np.exp(-x))
+    assert np.allclose((A, B), (-3, -1))
+    A, B = exponential_fit(
+        np.vstack([x, x]), np.vstack([np.exp(x), 2 * np.exp(3 * x)])
+    )
+    assert np.allclose(A, [1, 2]) and np.allclose(B, [1, 3])
+    with pytest.raises(ValueError):
+        exponential_fit(x, x - 1.5)
+
+
+def test_exponential_tail_correction():
+    r = np.linspace(0, 3, 61)
+    V = 0.1 * np.exp(1.5 * r)
+    V_tail = np.copy(V)
+    V_tail[50:] = np.nan
+    corrected = exponential_tail_correction(r, V_tail, cutoff=50)
+    assert np.allclose(corrected, V)
+    assert np.array_equal(exponential_tail_correction(r, np.copy(V), 61), V)
+    corrected = exponential_tail_correction(r[:8], V_tail[:8], cutoff=3)
+    assert np.allclose(corrected, V[:8])
+    V_mixed = 2 * r - 1
+    V_mixed[50:] = np.nan
+    with pytest.warns(UserWarning):
+        corrected = exponential_tail_correction(r, V_mixed, cutoff=13)
+    assert np.allclose(corrected, 2 * r - 1)
+    V_bad = np.full_like(r, np.inf)
+    V_bad[10:40] = 20 * (r[10:40] - 1.2) ** 2 + 1
+    new_V, real, head, tail = bond_correction(r, V_bad, "exponential")
+    assert np.all(np.isfinite(new_V))
+
+
+def test_linear_corrections_optimized():
+    r = np.linspace(0, 3, 61)
+    V = 2 * r - 1
+    V_missing = np.copy(V)
+    V_missing[:10] = np.inf
+    V_missing[50:] = np.nan
+    corrected = linear_head_correction_optimized(r, V_missing, cutoff=9)
+    corrected = linear_tail_correction_optimized(r, corrected, cutoff=50)
+    assert np.allclose(corrected, V)
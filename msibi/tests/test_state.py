@@ -4,8 +4,9 @@ import numpy as np
 import pytest
 
 from msibi import MSIBI, State, Bond, Angle 
+from msibi.analysis import Topology
 
-from .base_test import BaseTest
+from .base_test import BaseTest, test_assets
 
 
 class TestState(BaseTest):
@@ -18,3 +19,105 @@ class TestState(BaseTest):
     def test_n_frames(self, stateX):
         stateX.nframes = 50
         assert stateX.nframes == 50
+
+    def test_topology(self, stateX):
+        topology = stateX.topology
+        assert stateX.topology is topology
+        assert topology.types == ["A", "B"]
+        assert topology.matching_groups("bonds", ["A-B"]).dtype == np.int32
+        assert not os.path.exists(os.path.join(stateX.dir, "topology.npz"))
+
+    def test_save_topology(self, tmp_path):
+        cache_dir = os.path.join(tmp_path, "cache")
+        states = []
+        for name in ["Z1", "Z2"]:
+            states.append(
+                State(
+                    name=name,
+                    kT=1.0,
+                    traj_file=os.path.join(test_assets, "AB-1.0kT.gsd"),
+                    n_frames=10,
+                    save_topology=True,
+                    cache_dir=cache_dir,
+                    _dir=tmp_path
+                )
+            )
+        topology = states[0].topology
+        file_path = states[0]._cache_path("topology.npz")
+        assert os.path.exists(file_path)
+        # A new state of the same trajectory loads the saved topology
+        loaded = states[1].topology
+        assert states[1]._cache_path("topology.npz") == file_path
+        assert states[1]._start_frame is None
+        assert loaded.types == topology.types
+        assert np.array_equal(loaded.molecule_ids, topology.molecule_ids)
+        for kind, groups in topology.groups.items():
+            for name, group in groups.items():
+                assert np.array_equal(loaded.groups[kind][name], group)
+        with pytest.raises(ValueError):
+            State(
+                name="Z3",
+                kT=1.0,
+                traj_file=os.path.join(test_assets, "AB-1.0kT.gsd"),
+                n_frames=10,
+                save_topology=True,
+                _dir=tmp_path
+            )
+
+    def test_start_frame(self, tmp_path, stateX):
+        assert stateX.start_frame is stateX.start_frame
+        assert not os.path.exists(os.path.join(stateX.dir, "start.gsd"))
+        state = State(
+                name="Z",
+                kT=1.0,
+                traj_file=os.path.join(test_assets, "AB-1.0kT.gsd"),
+                n_frames=10,
+                save_start_frame=True,
+                cache_dir=os.path.join(tmp_path, "cache"),
+                _dir=tmp_path
+        )
+        frame = state.start_frame
+        file_path = state._cache_path("start.gsd")
+        assert os.path.exists(file_path)
+        # The saved frame is read back without opening traj_file
+        state._start_frame = None
+        state.traj_file = os.path.join(tmp_path, "missing.gsd")
+        assert np.array_equal(
+            state.start_frame.particles.position, frame.particles.position
+        )
+        assert np.array_equal(state.start_frame.bonds.group, frame.bonds.group)
+        with pytest.raises(ValueError):
+            State(
+                name="Z2",
+                kT=1.0,
+                traj_file=os.path.join(test_assets, "AB-1.0kT.gsd"),
+                n_frames=10,
+                save_start_frame=True,
+                _dir=tmp_path
+            )
+
+    def test_target_cache(self, tmp_path):
+        cache_dir = os.path.join(tmp_path, "cache")
+        distributions = []
+        for name in ["C1", "C2"]:
+            state = State(
+                    name=name,
+                    kT=1.0,
+                    traj_file=os.path.join(test_assets, "AB-1.0kT.gsd"),
+                    n_frames=10,
+                    cache_dir=cache_dir,
+                    _dir=tmp_path
+            )
+            bond = Bond(type1="A", type2="B", optimize=True, nbins=60)
+            bond.set_quadratic(x_min=0.0, x_max=3.0, x0=1, k2=200, k3=0, k4=0)
+            bond._add_state(state)
+            distributions.append(bond.target_distribution(state))
+            n_cached = len(
+                [f for f in os.listdir(cache_dir) if f.endswith(".npy")]
+            )
+            assert n_cached == 1
+        assert np.array_equal(distributions[0], distributions[1])
+        bond.nbins = 50
+        bond.target_distribution(state)
+        n_cached = len([f for f in os.listdir(cache_dir) if f.endswith(".npy")])
+        assert n_cached == 2
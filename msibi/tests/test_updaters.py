@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+
+from msibi import Bond
+from msibi.updaters import IBI, IMC, Anderson, get_updater
+
+from .base_test import BaseTest
+
+
+class TestUpdaters(BaseTest):
+    @pytest.fixture
+    def optimized_bond(self, stateX):
+        bond = Bond(type1="A", type2="B", optimize=True, nbins=60)
+        bond.set_quadratic(x_min=0.0, x_max=3.0, x0=1, k2=200, k3=0, k4=0)
+        bond._add_state(stateX)
+        x = bond.x_range
+        target = np.exp(-((x - 1.0) ** 2) / 0.1)
+        current = np.exp(-((x - 1.2) ** 2) / 0.1)
+        bond.set_target_distribution(
+            stateX, np.vstack([x, target / target.sum()]).T
+        )
+        bond._set_current_distributions(
+            [np.vstack([x, current / current.sum()]).T]
+        )
+        rng = np.random.default_rng(42)
+        stateX._query_frame_counts[bond._key] = rng.multinomial(
+            200, current / current.sum(), size=50
+        )
+        return bond
+
+    def test_get_updater(self):
+        assert isinstance(get_updater("ibi"), IBI)
+        assert isinstance(get_updater("IMC"), IMC)
+        anderson = Anderson(memory=3)
+        assert get_updater(anderson) is anderson
+        with pytest.raises(ValueError):
+            get_updater("newton")
+        with pytest.raises(ValueError):
+            Bond(type1="A", type2="B", optimize=True, nbins=60, update_method=1)
+
+    def test_ibi(self, optimized_bond, stateX):
+        state_dict = optimized_bond._states[stateX]
+        expected = stateX.kT * np.log(
+            state_dict["current_distribution"][:, 1]
+            / optimized_bond.target_distribution(stateX)[:, 1]
+        )
+        assert np.allclose(IBI().step(optimized_bond), expected)
+
+    def test_ibi_states(self, optimized_bond, stateX, stateY):
+        optimized_bond._add_state(stateY)
+        stateY.alpha = 0.5
+        x = optimized_bond.x_range
+        target = optimized_bond.target_distribution(stateX)
+        optimized_bond.set_target_distribution(stateY, target)
+        current = np.exp(-((x - 0.9) ** 2) / 0.1)
+        current_x = optimized_bond._states[stateX]["current_distribution"]
+        optimized_bond._set_current_distributions(
+            [current_x, np.vstack([x, current / current.sum()]).T]
+        )
+        expected = 0
+        for state in (stateX, stateY):
+            state_current = optimized_bond._states[state]["current_distribution"]
+            expected = expected + state.alpha * state.kT * np.log(
+                state_current[:, 1] / target[:, 1]
+            ) / 2
+        assert np.allclose(IBI().step(optimized_bond), expected)
+
+    def test_imc(self, optimized_bond, stateX):
+        dV = IMC().step(optimized_bond)
+        ibi_dV = IBI().step(optimized_bond)
+        sampled = np.isfinite(dV)
+        assert np.any(sampled)
+        assert np.all(np.isfinite(ibi_dV[sampled]))
+        # Both raise the potential where the current distribution is too high
+        x = optimized_bond.x_range
+        right = sampled & (x > 1.25) & (x < 1.4)
+        assert np.all(dV[right] > 0) and np.all(ibi_dV[right] > 0)
+
+    def test_anderson(self, optimized_bond, stateX):
+        anderson = Anderson(memory=2)
+        ibi_dV = IBI().step(optimized_bond)
+        assert np.allclose(anderson.step(optimized_bond), ibi_dV)
+        optimized_bond.potential = optimized_bond.potential + ibi_dV
+        dV = anderson.step(optimized_bond)
+        assert dV.shape == ibi_dV.shape
+        assert len(anderson._residuals) == 2
+        for i in range(3):
+            anderson.step(optimized_bond)
+        assert len(anderson._residuals) == 3
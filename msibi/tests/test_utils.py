@@ -1,9 +1,24 @@
+import math
+import os
+import pickle
+import subprocess
+import sys
+
 import numpy as np
 import pytest
 
+from msibi.utils.cache import cache_key, file_hash, load_array, save_array
 from msibi.utils.error_calculation import calc_similarity
 from msibi.utils.general import find_nearest
-from msibi.utils.smoothing import savitzky_golay
+from msibi.utils.history import History
+from msibi.utils.reweighting import (
+    boltzmann_weights,
+    effective_sample_size,
+    reweight_distribution,
+)
+from msibi.utils.schedules import AdaptiveSchedule, scheduled_value
+from msibi.utils.smoothing import savitzky_golay, savitzky_golay_kernel
+from msibi.utils.store import DistributionStore, read_distributions
 
 
 def test_calc_similarity():
@@ -15,6 +30,113 @@ def test_calc_similarity():
     arr1 = np.random.random(10)
     arr2 = np.random.random(10)
     assert calc_similarity(arr1, arr2) == calc_similarity(arr2, arr1)
+    stacked = calc_similarity(np.vstack([a, arr1[:1] * a]), np.vstack([a, b]))
+    assert np.allclose(stacked, [1.0, calc_similarity(arr1[:1] * a, b)])
+
+def test_cache(tmp_path):
+    data_file = tmp_path / "data.txt"
+    data_file.write_text("abc")
+    cache_dir = str(tmp_path / "cache")
+    digest = file_hash(str(data_file), cache_dir)
+    assert digest == file_hash(str(data_file))
+    assert digest == file_hash(str(data_file), cache_dir)
+    data_file.write_text("abcd")
+    assert digest != file_hash(str(data_file), cache_dir)
+
+    key = cache_key(trajectory=digest, nbins=10)
+    assert key == cache_key(nbins=10, trajectory=digest)
+    assert key != cache_key(trajectory=digest, nbins=11)
+    assert load_array(cache_dir, key) is None
+    save_array(cache_dir, key, np.arange(5.0))
+    assert np.array_equal(load_array(cache_dir, key), np.arange(5.0))
+
+def test_reweighting():
+    weights = boltzmann_weights(np.zeros(10), kT=1.0)
+    assert np.allclose(weights, 0.1)
+    assert np.isclose(effective_sample_size(weights), 10)
+    weights = boltzmann_weights(np.array([0.0, 1000.0]), kT=1.0)
+    assert np.isclose(effective_sample_size(weights), 1)
+
+    frame_counts = np.array([[2, 0, 1], [0, 2, 1]])
+    distribution = np.array([[0, 1/3], [1, 1/3], [2, 1/3]])
+    same = reweight_distribution(distribution, frame_counts, np.ones(2))
+    assert np.allclose(same, distribution)
+    first = reweight_distribution(distribution, frame_counts, np.array([1, 0]))
+    assert np.allclose(first[:, 1], [2/3, 0, 1/3])
+
+
+def test_history(tmp_path):
+    history = History()
+    history.append(np.arange(3.0))
+    history.append(np.arange(4.0))
+    assert len(history) == 2
+    assert history.file_path is None
+    assert np.array_equal(history[-1], np.arange(4.0))
+
+    file_path = os.path.join(tmp_path, "history.bin")
+    history = History(file_path, max_in_memory=2)
+    entries = [np.full((i + 1, 2), float(i)) for i in range(5)]
+    for entry in entries:
+        history.append(entry)
+    assert len(history) == 5
+    assert len(history._entries) == 2
+    for entry, stored in zip(entries, history):
+        assert np.array_equal(entry, stored)
+    assert np.array_equal(history[1:3][1], entries[2])
+    with pytest.raises(IndexError):
+        history[5]
+    restored = pickle.loads(pickle.dumps(history))
+    restored.append(np.zeros(3))
+    assert len(restored) == 6
+    assert np.array_equal(restored[0], entries[0])
+
+    history = History(file_path, max_in_memory=0)
+    for i in range(3):
+        history.append(np.full(4, i))
+    assert np.array(history).shape == (3, 4)
+    with pytest.raises(ValueError):
+        History(max_in_memory=2)
+
+    checkpoint = pickle.dumps(history)
+    history.append(np.full(4, 3))
+    restored = pickle.loads(checkpoint)
+    restored.truncate()
+    restored.append(np.full(4, 5))
+    assert np.array_equal(np.array(restored)[:, 0], [0, 1, 2, 5])
+    assert os.path.getsize(file_path) == 4 * 4 * 8
+
+
+def test_distribution_store(tmp_path):
+    file_path = os.path.join(tmp_path, "distributions.bin")
+    assert read_distributions(file_path) == {}
+    store = DistributionStore(file_path)
+    for iteration in range(3):
+        store.append(("Bond", "A-B"), iteration, np.full((5, 2), iteration))
+        store.append(("Pair", "A-B"), iteration, np.zeros((8, 2)))
+    distributions = read_distributions(file_path)
+    assert set(distributions) == {("Bond", "A-B"), ("Pair", "A-B")}
+    bond = distributions[("Bond", "A-B")]
+    assert np.array_equal(bond["iterations"], [0, 1, 2])
+    assert bond["distributions"].shape == (3, 5, 2)
+    assert np.all(bond["distributions"][2] == 2)
+
+    store.truncate(2)
+    distributions = read_distributions(file_path)
+    assert np.array_equal(distributions[("Bond", "A-B")]["iterations"], [0, 1])
+    assert np.array_equal(distributions[("Pair", "A-B")]["iterations"], [0, 1])
+
+
+def test_lazy_imports():
+    heavy = ["cmeutils", "freud", "hoomd", "matplotlib", "pandas", "scipy"]
+    code = (
+        "import sys, msibi; "
+        f"print([m for m in {heavy} if m in sys.modules])"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    assert result.stdout.strip() == "[]"
+
 
 def test_find_nearest():
     a = np.arange(10)
@@ -44,3 +166,49 @@ def test_savitzky_golay():
         y2 = savitzky_golay(y, 3, 3)
     with pytest.raises(TypeError):
         y2 = savitzky_golay(y, 3, 2)
+
+
+def test_savitzky_golay_batch():
+    x = np.linspace(0, 3, 61)
+    y = np.vstack([np.sin(x), np.exp(-(x - 1) ** 2), x ** 2])
+    y += np.random.default_rng(0).normal(0, 0.05, y.shape)
+    for window_size, order, deriv in [(3, 1, 0), (5, 2, 0), (7, 3, 1)]:
+        smoothed = savitzky_golay(y, window_size, order, deriv=deriv, rate=2)
+        assert smoothed.shape == y.shape
+        # Reference: the filter applied to each row with np.convolve
+        half = window_size // 2
+        b = np.array(
+            [[k ** i for i in range(order + 1)] for k in range(-half, half + 1)]
+        )
+        m = np.linalg.pinv(b)[deriv] * 2 ** deriv * math.factorial(deriv)
+        for row, smoothed_row in zip(y, smoothed):
+            padded = np.concatenate((
+                row[0] - np.abs(row[1:half + 1][::-1] - row[0]),
+                row,
+                row[-1] + np.abs(row[-half - 1:-1][::-1] - row[-1])
+            ))
+            expected = np.convolve(m[::-1], padded, mode="valid")
+            assert np.allclose(smoothed_row, expected)
+            assert np.allclose(
+                savitzky_golay(row, window_size, order, deriv, 2), expected
+            )
+    kernel = savitzky_golay_kernel(5, 2)
+    assert savitzky_golay_kernel(5, 2) is kernel
+    assert not kernel.flags.writeable
+
+
+def test_schedules():
+    assert scheduled_value(500, 3) == 500
+    assert scheduled_value([100, 200], 0) == 100
+    assert scheduled_value([100, 200], 5) == 200
+    assert scheduled_value(lambda i: 100 * (i + 1), 2) == 300
+    schedule = AdaptiveSchedule(start=100, stop=1000)
+    assert scheduled_value(schedule, 0) == 100
+    schedule.update(4.0)
+    assert schedule(1) == 100
+    schedule.update(1.0)
+    assert schedule(2) == 400
+    schedule.update(1e-3)
+    assert schedule(3) == 1000
+    with pytest.raises(ValueError):
+        AdaptiveSchedule(start=100, stop=10)
@@ -0,0 +1,179 @@
+import numpy as np
+
+
+class Updater(object):
+    """
+    Base class of the rules used to update an optimized table potential.
+    Don't call this class directly, instead use
+    msibi.updaters.IBI, msibi.updaters.IMC or msibi.updaters.Anderson.
+
+    Updaters are selected per force with msibi.forces.Force.update_method.
+    An updater may keep a history of previous iterations, so each force
+    needs its own instance.
+
+    """
+    # If True, the query distributions are accumulated per frame as well.
+    needs_frame_counts = False
+
+    def __repr__(self):
+        return f"Updater: {self.__class__.__name__}"
+
+    def step(self, force) -> np.ndarray:
+        """The change to a force's potential in the next iteration.
+
+        Parameters
+        ----------
+        force : msibi.forces.Force, required
+            The force being optimized, with the current distribution of
+            every state already computed.
+
+        Returns
+        -------
+        np.ndarray
+            The change in V(x). Non-finite values mark the x values
+            that are repaired by the force's head and tail corrections.
+
+        """
+        raise NotImplementedError
+
+
+class IBI(Updater):
+    """
+    Iterative Boltzmann inversion, averaged over all states:
+
+        dV(x) = sum_states alpha * kT * ln(P_current(x) / P_target(x)) / N
+
+    """
+
+    def step(self, force) -> np.ndarray:
+        return _ibi_step(force)
+
+
+class IMC(Updater):
+    """
+    Inverse Monte Carlo (Newton-Raphson) updates.
+
+    The histogram counts S of each query frame give the linear response
+    of the average counts to a change in the table potential through
+    their covariance C over the frames:
+
+        dV = kT (C + lambda D)^-1 (<S> - S_target)
+
+    where S_target are the counts matching the target distribution and
+    D is the diagonal of C. The change is averaged over all states as
+    in IBI. Bins that are not sampled, or are empty in either
+    distribution, are left to the head and tail corrections.
+
+    Parameters
+    ----------
+    regularization : float, optional, default 1.0
+        lambda, damping the Newton step. Larger values give smaller
+        steps, which are more robust far from convergence.
+
+    """
+
+    needs_frame_counts = True
+
+    def __init__(self, regularization: float=1.0):
+        if regularization <= 0:
+            raise ValueError("The regularization must be positive.")
+        self.regularization = regularization
+
+    def step(self, force) -> np.ndarray:
+        N = len(force._states)
+        targets = force._stacked_target_distributions()
+        dV = 0
+        for i, state in enumerate(force._states):
+            frame_counts = force._frame_counts(state)
+            if len(frame_counts) < 2:
+                raise ValueError(
+                    "IMC updates need at least 2 query frames per state."
+                )
+            mean_counts = frame_counts.mean(axis=0)
+            current = force._current_distributions[i, :, 1]
+            target = targets[i]
+            sampled = frame_counts.var(axis=0) > 0
+            valid = sampled & (current > 0) & (target > 0)
+            residual = mean_counts[valid] * (1 - target[valid] / current[valid])
+            cov = np.atleast_2d(np.cov(frame_counts[:, valid], rowvar=False))
+            damping = self.regularization * np.diag(np.diag(cov))
+            state_dV = np.full(len(mean_counts), np.nan)
+            state_dV[valid] = state.kT * np.linalg.solve(
+                cov + damping, residual
+            )
+            dV = dV + state.alpha * state_dV / N
+        return dV
+
+
+class Anderson(Updater):
+    """
+    Anderson (DIIS) mixing of the IBI updates.
+
+    The IBI update r(V) is treated as the residual of the fixed point
+    V = V + r(V). The next potential combines the last few potentials
+    V_k and residuals r_k so that their extrapolated residual is smallest:
+
+        V_next = V_k + mixing * r_k - (dV + mixing * dR) gamma
+
+    where dV and dR hold the differences between successive potentials
+    and residuals, and gamma minimizes |r_k - dR gamma|.
+
+    Parameters
+    ----------
+    memory : int, optional, default 5
+        The number of previous iterations used.
+    mixing : float, optional, default 1.0
+        The fraction of the IBI update applied, as in simple mixing.
+
+    """
+
+    def __init__(self, memory: int=5, mixing: float=1.0):
+        if not isinstance(memory, int) or memory <= 0:
+            raise ValueError("memory must be a positive integer.")
+        self.memory = memory
+        self.mixing = mixing
+        self._potentials = []
+        self._residuals = []
+
+    def step(self, force) -> np.ndarray:
+        residual = _ibi_step(force)
+        self._potentials.append(np.copy(force.potential))
+        self._residuals.append(np.copy(residual))
+        self._potentials = self._potentials[-(self.memory + 1):]
+        self._residuals = self._residuals[-(self.memory + 1):]
+        dV = self.mixing * residual
+        residuals = np.array(self._residuals)
+        finite = np.all(np.isfinite(residuals), axis=0)
+        if len(residuals) < 2 or not np.any(finite):
+            return dV
+        dR = np.diff(residuals[:, finite], axis=0).T
+        dP = np.diff(np.array(self._potentials)[:, finite], axis=0).T
+        gamma = np.linalg.lstsq(dR, residual[finite], rcond=None)[0]
+        dV[finite] -= (dP + self.mixing * dR) @ gamma
+        return dV
+
+
+def get_updater(update_method) -> Updater:
+    """Get an updater from its name ("ibi", "imc" or "anderson"),
+    or pass an Updater instance through unchanged.
+    """
+    if isinstance(update_method, Updater):
+        return update_method
+    updaters = {"ibi": IBI, "imc": IMC, "anderson": Anderson}
+    try:
+        return updaters[update_method.lower()]()
+    except (KeyError, AttributeError):
+        raise ValueError(
+            f"Unsupported update method: {update_method}. "
+            f"Use one of {list(updaters)} or an msibi.updaters.Updater."
+        )
+
+
+def _ibi_step(force) -> np.ndarray:
+    """The IBI change to a force's potential, see IBI."""
+    current = force._current_distributions[..., 1]
+    target = force._stacked_target_distributions()
+    kT, alpha = force._state_parameters()
+    return np.mean(
+        (alpha * kT)[:, None] * np.log(current / target), axis=0
+    )
@@ -0,0 +1,83 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+
+
+def file_hash(file_path: str, cache_dir: str=None) -> str:
+    """The sha256 hash of a file's contents.
+
+    Parameters
+    ----------
+    file_path : str, required
+        Path to the file to hash.
+    cache_dir : str, optional
+        If given, hashes are remembered in this directory and only
+        recomputed when the file's size or modification time changes.
+
+    """
+    file_path = os.path.abspath(file_path)
+    stat = os.stat(file_path)
+    signature = [stat.st_size, stat.st_mtime_ns]
+    index_path = None
+    if cache_dir is not None:
+        index_path = os.path.join(cache_dir, "file_hashes.json")
+        index = _read_json(index_path)
+        entry = index.get(file_path)
+        if entry and entry["signature"] == signature:
+            return entry["sha256"]
+    sha = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 24), b""):
+            sha.update(chunk)
+    digest = sha.hexdigest()
+    if index_path is not None:
+        index = _read_json(index_path)
+        index[file_path] = dict(signature=signature, sha256=digest)
+        write_atomic(
+            index_path, lambda f: f.write(json.dumps(index).encode())
+        )
+    return digest
+
+
+def cache_key(**kwargs) -> str:
+    """Combine keyword arguments into a single hash used as a cache key."""
+    text = json.dumps(kwargs, sort_keys=True, default=str)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def load_array(cache_dir: str, key: str):
+    """Load the array stored under key, or None if it is not cached."""
+    file_path = os.path.join(cache_dir, f"{key}.npy")
+    if not os.path.exists(file_path):
+        return None
+    return np.load(file_path)
+
+
+def save_array(cache_dir: str, key: str, array: np.ndarray) -> None:
+    """Store an array under key."""
+    os.makedirs(cache_dir, exist_ok=True)
+    write_atomic(
+        os.path.join(cache_dir, f"{key}.npy"), lambda f: np.save(f, array)
+    )
+
+
+def _read_json(file_path: str) -> dict:
+    if not os.path.exists(file_path):
+        return dict()
+    with open(file_path) as f:
+        return json.load(f)
+
+
+def write_atomic(file_path: str, write) -> None:
+    """Write to a temporary file, then move it into place so that
+    concurrent jobs never see a partially written file.
+    """
+    os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+    tmp_path = f"{file_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, file_path)
@@ -1,7 +1,21 @@
 import numpy as np
 
 
-def calc_similarity(arr1, arr2):
-    f_fit = np.sum(np.absolute(arr1 - arr2))
-    f_fit /= np.sum((np.absolute(arr1) + np.absolute(arr2)))
+def calc_similarity(arr1, arr2, axis=-1):
+    """The similarity of two distributions, 1 minus their normalized
+    absolute difference. Identical distributions score 1.0.
+
+    Parameters
+    ----------
+    arr1, arr2 : array-like
+        The distributions to compare. 2D arrays hold one distribution
+        per row, e.g. one per state, and are compared row by row.
+    axis : int, optional, default -1
+        The axis holding the values of each distribution.
+
+    """
+    arr1 = np.asarray(arr1)
+    arr2 = np.asarray(arr2)
+    f_fit = np.sum(np.absolute(arr1 - arr2), axis=axis)
+    f_fit = f_fit / np.sum(np.absolute(arr1) + np.absolute(arr2), axis=axis)
     return 1.0 - f_fit
@@ -0,0 +1,117 @@
+import os
+
+import numpy as np
+
+
+class History(object):
+    """
+    An append-only, list-like history of arrays.
+
+    Without a file, every entry is kept in memory like a list. With a
+    file, every entry is also appended to it as raw float64 data and
+    only the last max_in_memory entries are kept in memory. Older
+    entries are read back from the file through np.memmap when indexed.
+
+    Parameters
+    ----------
+    file_path : str, optional, default None
+        The binary file the entries are appended to.
+        Any existing file is overwritten.
+    max_in_memory : int, optional, default None
+        The number of most recent entries kept in memory.
+        If None, all entries are kept. Requires file_path.
+
+    Notes
+    -----
+    Entries may have different shapes. The offset and shape of each
+    entry in the file are kept in memory and pickled with the History,
+    so a History restored from a checkpoint keeps reading and appending
+    to the same file.
+
+    """
+
+    def __init__(self, file_path: str=None, max_in_memory: int=None):
+        if max_in_memory is not None:
+            if not isinstance(max_in_memory, int) or max_in_memory < 0:
+                raise ValueError(
+                    "max_in_memory must be a non-negative integer."
+                )
+            if file_path is None:
+                raise ValueError(
+                    "A file_path is needed to limit the entries in memory."
+                )
+        self.file_path = file_path
+        self.max_in_memory = max_in_memory
+        self._entries = []
+        self._index = []
+        if file_path is not None:
+            os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+            open(file_path, "wb").close()
+
+    def __repr__(self):
+        return (
+            f"History: {len(self)} entries; "
+            + f"{len(self._entries)} in memory; "
+            + f"File: {self.file_path}"
+        )
+
+    def __len__(self):
+        if self.file_path is None:
+            return len(self._entries)
+        return len(self._index)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        n_entries = len(self)
+        if idx < 0:
+            idx += n_entries
+        if not 0 <= idx < n_entries:
+            raise IndexError("History index out of range")
+        first_in_memory = n_entries - len(self._entries)
+        if idx >= first_in_memory:
+            return self._entries[idx - first_in_memory]
+        offset, shape = self._index[idx]
+        if np.prod(shape) == 0:
+            return np.empty(shape)
+        return np.array(
+            np.memmap(
+                self.file_path, dtype=float, mode="r", offset=offset, shape=shape
+            )
+        )
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self[idx]
+
+    def __array__(self, dtype=None, copy=None):
+        return np.array(list(self), dtype=dtype)
+
+    def truncate(self) -> None:
+        """Drop any data written to the file after the last entry,
+        e.g. by a run interrupted before the History was checkpointed.
+        """
+        if self.file_path is None or not os.path.exists(self.file_path):
+            return
+        end = 0
+        if self._index:
+            offset, shape = self._index[-1]
+            end = offset + int(np.prod(shape)) * np.dtype(float).itemsize
+        if os.path.getsize(self.file_path) > end:
+            with open(self.file_path, "r+b") as f:
+                f.truncate(end)
+
+    def append(self, entry) -> None:
+        """Add a copy of an array to the end of the history."""
+        entry = np.array(entry, dtype=float)
+        if self.file_path is not None:
+            with open(self.file_path, "ab") as f:
+                offset = f.seek(0, os.SEEK_END)
+                f.write(entry.tobytes())
+            self._index.append((offset, entry.shape))
+        self._entries.append(entry)
+        if (
+            self.max_in_memory is not None
+            and len(self._entries) > self.max_in_memory
+        ):
+            del self._entries[0]
@@ -0,0 +1,53 @@
+import numpy as np
+
+
+def boltzmann_weights(delta_U, kT):
+    """Normalized weights exp(-delta_U/kT) of each frame.
+
+    Parameters
+    ----------
+    delta_U : np.ndarray, shape=(n_frames,)
+        The change in potential energy of each frame
+        between the sampled and the trial potential.
+    kT : float
+        The temperature of the sampled state.
+
+    """
+    x = -np.asarray(delta_U, dtype=float) / kT
+    weights = np.exp(x - x.max())
+    return weights / weights.sum()
+
+
+def effective_sample_size(weights):
+    """Kish's effective number of samples, (sum w)^2 / sum w^2."""
+    weights = np.asarray(weights)
+    return np.sum(weights)**2 / np.sum(weights**2)
+
+
+def reweight_distribution(distribution, frame_counts, weights):
+    """Estimate a distribution under new frame weights.
+
+    Each bin of the sampled distribution is scaled by the ratio of its
+    weighted to unweighted mean count per frame.
+
+    Parameters
+    ----------
+    distribution : np.ndarray, shape=(n_bins, 2)
+        The distribution sampled with equally weighted frames.
+    frame_counts : np.ndarray, shape=(n_frames, n_bins)
+        The histogram counts of each frame.
+    weights : np.ndarray, shape=(n_frames,)
+        The weight of each frame, see boltzmann_weights().
+
+    """
+    mean_counts = frame_counts.mean(axis=0)
+    weighted_counts = weights @ frame_counts / np.sum(weights)
+    ratio = np.divide(
+        weighted_counts,
+        mean_counts,
+        out=np.zeros_like(weighted_counts, dtype=float),
+        where=mean_counts > 0
+    )
+    new_distribution = np.copy(distribution)
+    new_distribution[:, 1] *= ratio
+    return new_distribution
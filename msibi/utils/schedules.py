@@ -0,0 +1,71 @@
+import numpy as np
+
+
+class AdaptiveSchedule(object):
+    """
+    A schedule that increases with the convergence of the potentials,
+    for the n_steps or n_frames of msibi.optimize.MSIBI.run_optimization().
+
+    The value starts at start and grows in inverse proportion to the
+    largest change made to any optimized potential in the last iteration,
+    relative to the change made in the first iteration:
+
+        value = start * first_change / last_change
+
+    limited to between start and stop. Early iterations, with large
+    changes to the potentials, are run briefly while later iterations
+    sample for longer.
+
+    Parameters
+    ----------
+    start : int, required
+        The value used in the first iterations.
+    stop : int, required
+        The largest value used.
+
+    """
+
+    def __init__(self, start: int, stop: int):
+        if not 0 < start <= stop:
+            raise ValueError("start and stop must satisfy 0 < start <= stop.")
+        self.start = int(start)
+        self.stop = int(stop)
+        self._first_change = None
+        self._last_change = None
+
+    def __repr__(self):
+        return f"AdaptiveSchedule: {self.start} to {self.stop}"
+
+    def __call__(self, iteration: int) -> int:
+        if not self._first_change or self._last_change is None:
+            return self.start
+        if self._last_change == 0:
+            return self.stop
+        value = self.start * self._first_change / self._last_change
+        return int(np.clip(value, self.start, self.stop))
+
+    def update(self, potential_change: float) -> None:
+        """Record the largest change made to any potential in an iteration."""
+        if self._first_change is None:
+            self._first_change = potential_change
+        self._last_change = potential_change
+
+
+def scheduled_value(schedule, iteration: int) -> int:
+    """The value of a schedule at an iteration.
+
+    Parameters
+    ----------
+    schedule : int, list of int or callable, required
+        A constant value, a value per iteration (the last value is used
+        for any later iterations), or a callable taking the iteration
+        and returning the value, e.g. an AdaptiveSchedule.
+    iteration : int, required
+        The iteration, counted from the start of the optimization.
+
+    """
+    if callable(schedule):
+        return int(schedule(iteration))
+    if isinstance(schedule, (list, tuple)):
+        return int(schedule[min(iteration, len(schedule) - 1)])
+    return int(schedule)
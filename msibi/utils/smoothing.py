@@ -1,26 +1,51 @@
+from functools import lru_cache
 from math import factorial
 
 import numpy as np
 
 
+@lru_cache(maxsize=None)
+def savitzky_golay_kernel(window_size, order, deriv=0, rate=1):
+    """The Savitzky-Golay filter coefficients, computed once per set
+    of parameters.
+
+    Returns
+    -------
+    np.ndarray, shape=(window_size,)
+        Read-only coefficients, applied to each window of the data.
+
+    """
+    half_window = (window_size - 1) // 2
+    b = np.vander(
+        np.arange(-half_window, half_window + 1), order + 1, increasing=True
+    ).astype(float)
+    kernel = np.linalg.pinv(b)[deriv] * rate ** deriv * factorial(deriv)
+    kernel.setflags(write=False)
+    return kernel
+
+
 def savitzky_golay(y, window_size, order, deriv=0, rate=1):
     """Smoothing filter used on distributions and potentials
 
     Parameters
     ----------
-    y: 1D array-like, required
-        The data sequence to be smoothed
+    y: 1D or 2D array-like, required
+        The data sequence to be smoothed. Each row of a 2D array is
+        smoothed separately, in one vectorized call.
     window_size : int, required
         The size of the smoothing window to use; must be an odd number
     order: int, required
         The polynomial order used by the smoothing filter
-    deriv:
-    rate:
+    deriv: int, optional, default 0
+        The order of the derivative to compute
+    rate: float, optional, default 1
+        Scales the derivative by rate ** deriv
 
     Returns
     -------
-    1D array-like
-        Smoothed array of y after passing through the filter
+    np.ndarray
+        Smoothed array of y after passing through the filter,
+        with the same shape as y
 
     """
     if not (isinstance(window_size, int) and isinstance(order, int)):
@@ -30,16 +55,16 @@ def savitzky_golay(y, window_size, order, deriv=0, rate=1):
     if window_size < order + 2:
         raise TypeError("window_size is too small for the polynomials order")
 
-    order_range = range(order + 1)
+    kernel = savitzky_golay_kernel(window_size, order, deriv, rate)
     half_window = (window_size - 1) // 2
-    b = np.mat(
-        [
-            [k ** i for i in order_range]
-            for k in range(-half_window, half_window + 1)
-        ]
+    y = np.asarray(y, dtype=float)
+    first = y[..., :1]
+    last = y[..., -1:]
+    # Pad both ends with values mirrored about the end points
+    firstvals = first - np.abs(y[..., 1:half_window + 1][..., ::-1] - first)
+    lastvals = last + np.abs(y[..., -half_window - 1:-1][..., ::-1] - last)
+    padded = np.concatenate((firstvals, y, lastvals), axis=-1)
+    windows = np.lib.stride_tricks.sliding_window_view(
+        padded, window_size, axis=-1
     )
-    m = np.linalg.pinv(b).A[deriv] * rate ** deriv * factorial(deriv)
-    firstvals = y[0] - np.abs(y[1 : half_window + 1][::-1] - y[0])
-    lastvals = y[-1] + np.abs(y[-half_window - 1 : -1][::-1] - y[-1])
-    y = np.concatenate((firstvals, y, lastvals))
-    return np.convolve(m[::-1], y, mode="valid")
+    return windows @ kernel
@@ -0,0 +1,116 @@
+import os
+
+import numpy as np
+
+
+class DistributionStore(object):
+    """
+    An appendable binary file holding the distributions of many
+    forces over many iterations.
+
+    Each record is a pair of arrays written with np.save: a label
+    holding the force's class name, name and iteration, then the
+    distribution itself. Records are only ever appended, so a store
+    can be read while an optimization is still writing to it.
+
+    Parameters
+    ----------
+    file_path : str, required
+        The file the records are appended to.
+
+    """
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+
+    def __repr__(self):
+        return f"DistributionStore: {self.file_path}"
+
+    def append(self, key: tuple, iteration: int, distribution) -> None:
+        """Add the distribution of a force at an iteration.
+
+        Parameters
+        ----------
+        key : tuple of str, required
+            The force's class name and name, see Force._key.
+        iteration : int, required
+            The iteration the distribution belongs to.
+        distribution : np.ndarray, required
+            The distribution to store.
+
+        """
+        label = np.array([key[0], key[1], str(iteration)])
+        with open(self.file_path, "ab") as f:
+            np.save(f, label)
+            np.save(f, np.asarray(distribution, dtype=float))
+
+    def read(self) -> dict:
+        """Read every distribution in the store.
+
+        Returns
+        -------
+        dict
+            Maps each force's key to a dict holding the "iterations"
+            and the stacked "distributions", in the order written.
+
+        """
+        records = dict()
+        if not os.path.exists(self.file_path):
+            return records
+        size = os.path.getsize(self.file_path)
+        with open(self.file_path, "rb") as f:
+            while f.tell() < size:
+                label = np.load(f)
+                distribution = np.load(f)
+                key = (str(label[0]), str(label[1]))
+                iterations, distributions = records.setdefault(key, ([], []))
+                iterations.append(int(label[2]))
+                distributions.append(distribution)
+        return {
+            key: dict(
+                iterations=np.array(iterations),
+                distributions=np.array(distributions)
+            )
+            for key, (iterations, distributions) in records.items()
+        }
+
+    def truncate(self, n_iterations: int) -> None:
+        """Drop the records of iteration n_iterations and later.
+
+        Records are appended in iteration order, so the file is cut
+        at the first record to drop.
+
+        Parameters
+        ----------
+        n_iterations : int, required
+            The number of iterations to keep.
+
+        """
+        if not os.path.exists(self.file_path):
+            return
+        size = os.path.getsize(self.file_path)
+        with open(self.file_path, "r+b") as f:
+            while f.tell() < size:
+                offset = f.tell()
+                label = np.load(f)
+                np.load(f)
+                if int(label[2]) >= n_iterations:
+                    f.truncate(offset)
+                    return
+
+
+def read_distributions(file_path: str) -> dict:
+    """Read the query distributions saved in a state's directory.
+
+    Parameters
+    ----------
+    file_path : str, required
+        A state's distribution store, see State.distribution_file.
+
+    Returns
+    -------
+    dict
+        See DistributionStore.read().
+
+    """
+    return DistributionStore(file_path).read()